@@ -9,10 +9,23 @@ usage of SpeReference class:
 - create reference to data with construction of class: img_reference = SpeReference(spe_file)
 - when data is needed, call GetData: image = self.img_reference.GetData(frames=[idx], rois=[])[0][0]
 ----- that will get frame #idx in the first region into a numpy array
+- for large files, construct with memmap=True: img_reference = SpeReference(spe_file, memmap=True)
+----- GetData then returns views (native pixel type) into one memory map of the data block instead of float64 copies
+----- GetView(roi) gives the whole (frames, height, width) view of a region
+- Roi(idx) returns a lazy SpeArray for a region that can be sliced like a numpy array: spe.Roi(0)[1000:2000:10, :, 200:300]
+----- only the frames and rows needed for the slice are read, np.asarray(spe.Roi(0)) reads everything
 """
 
+import os
+import glob
+import pickle
+import threading
+import time
+from collections import OrderedDict, deque
+from xml.sax.saxutils import quoteattr
 import numpy as np
 import xml.etree.ElementTree as ET
+from speXml import IndexFooter, GetSettingsSummary
 
 class ROI:
     def __init__(self,width,height,stride):
@@ -25,11 +38,13 @@ class ROI:
         self.ybin = 1
         
 class MetaContainer:
-    def __init__(self,metaType,stride,*,metaEvent:str='',metaResolution:np.int64=0):
+    def __init__(self,metaType,stride,*,metaEvent:str='',metaResolution:np.int64=0,metaDataType:str='',metaComponent:str=''):
         self.metaType=metaType
         self.stride=stride
         self.metaEvent=metaEvent
         self.metaResolution=metaResolution
+        self.metaDataType=metaDataType
+        self.metaComponent=metaComponent
         
 class dataContainer:
     def __init__(self,data,**kwargs):
@@ -79,7 +94,7 @@ def readSpe(filePath):
                             for child2 in child1:
                                 metaType = child2.tag.rsplit('}',maxsplit=1)[1]
                                 metaEvent = child2.get('event')
-                                metaStride = np.int64(np.int64(child2.get('bitDepth'))/8)
+                                metaStride = np.int64(child2.get('bitDepth'))//8
                                 metaResolution = child2.get('resolution')
                                 if metaEvent != None and metaResolution !=None:
                                     metaList.append(MetaContainer(metaType,metaStride,metaEvent=metaEvent,metaResolution=np.int64(metaResolution)))
@@ -102,14 +117,15 @@ def readSpe(filePath):
             #read entire datablock
             f.seek(0)
             bpp = np.dtype(dataTypes[pixFormat]).itemsize
-            numPixels = np.int32((xmlLoc-4100)/bpp)  
+            #offsets are kept as exact python ints, data blocks can be well beyond 2**31 pixels
+            numPixels = (int(xmlLoc)-4100)//bpp
             totalBlock = np.fromfile(f,dtype=dataTypes[pixFormat],count=numPixels,offset=4100)
             for i in range(0,len(regionList)):
                 offLen=list()                
                 if i>0:
-                    regionOffset += (regionList[i-1].stride)/bpp                    
+                    regionOffset += int(regionList[i-1].stride)//bpp
                 for j in range(0,numFrames):
-                    offLen.append((np.int32(regionOffset+(j*readoutStride/bpp)),regionList[i].width*regionList[i].height))     
+                    offLen.append((regionOffset+(j*int(readoutStride))//bpp,int(regionList[i].width*regionList[i].height)))
                 regionData = np.concatenate([totalBlock[offset:offset+length] for offset,length in offLen])
                 dataList.append(np.reshape(regionData,(numFrames,regionList[i].height,regionList[i].width),order='C'))
                 
@@ -126,11 +142,11 @@ def readSpe(filePath):
             f.seek(108)
             datatype=np.fromfile(f,dtype=np.int16,count=1)[0]
             f.seek(42)
-            frameWidth=np.int16(np.fromfile(f,dtype=np.uint16,count=1)[0])
+            frameWidth=int(np.fromfile(f,dtype=np.uint16,count=1)[0])
             f.seek(656)
-            frameHeight=np.int16(np.fromfile(f,dtype=np.uint16,count=1)[0])
+            frameHeight=int(np.fromfile(f,dtype=np.uint16,count=1)[0])
             f.seek(1446)
-            numFrames=np.fromfile(f,dtype=np.int32,count=1)[0]
+            numFrames=int(np.fromfile(f,dtype=np.int32,count=1)[0])
             numPixels = frameWidth*frameHeight*numFrames
             bpp = np.dtype(dataTypes2[datatype]).itemsize
             dataList=list()            
@@ -138,17 +154,272 @@ def readSpe(filePath):
             totalBlock = np.fromfile(f,dtype=dataTypes2[datatype],count=numPixels,offset=4100)
             offLen=list()
             for j in range(0,numFrames):
-                offLen.append((np.int32((j*frameWidth*frameHeight)),frameWidth*frameHeight))
+                offLen.append((j*frameWidth*frameHeight,frameWidth*frameHeight))
             regionData = np.concatenate([totalBlock[offset:offset+length] for offset,length in offLen])
             dataList.append(np.reshape(regionData,(numFrames,frameHeight,frameWidth),order='C'))
             totalData=dataContainer(dataList)
             return totalData
 
-#right now works with spe3 only
+#returns an equivalent slice when the frame list is evenly spaced and increasing, so it can be served as a view
+def _FramesAsSlice(frames):
+    frames = np.asarray(frames,dtype=np.int64)
+    if len(frames) == 0:
+        return None
+    if len(frames) == 1:
+        return slice(int(frames[0]),int(frames[0])+1)
+    step = int(frames[1]-frames[0])
+    if step > 0 and np.all(np.diff(frames) == step):
+        return slice(int(frames[0]),int(frames[-1])+1,step)
+    return None
+
+#reads closer together than this many bytes are merged, reading the gap is cheaper than another seek
+_COALESCE_GAP = 1 << 20
+#upper bound on a single merged read
+_MAX_READ = 64 << 20
+
+#groups sorted, unique frames into runs [first, last) that can each be served by one contiguous read
+#spanLen is the number of bytes needed from each readout, stride the readout size
+def _PlanRuns(frames, stride: int, spanLen: int, *, maxGap: int=_COALESCE_GAP, maxRead: int=_MAX_READ):
+    if len(frames) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(frames)*stride - spanLen > maxGap) + 1
+    bounds = np.concatenate(([0], breaks, [len(frames)]))
+    framesPerRead = max(1, (maxRead-spanLen)//stride + 1)
+    runs = []
+    for first,last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        while first < last:
+            stop = int(np.searchsorted(frames, frames[first]+framesPerRead, side='left'))
+            stop = min(max(stop, first+1), last)
+            runs.append((first, stop))
+            first = stop
+    return runs
+
+#normalizes one axis of an index into (sorted indices to read, index to apply to what was read)
+#with span=True every index between the first and last is read (rows are contiguous on disk), otherwise only the ones asked for
+#ints and slices stay basic indices and advanced (list/array) indices stay advanced, so the combined result follows numpy rules
+def _AxisKey(key, length, axisName, *, span: bool=False):
+    if isinstance(key, slice):
+        r = range(*key.indices(length))
+        if len(r) == 0:
+            return np.zeros(0,dtype=np.int64), slice(0,0)
+        lo = min(r.start, r[-1])
+        if span:
+            stop = r.stop-lo if r.stop-lo >= 0 else None
+            return np.arange(lo, max(r.start, r[-1])+1, dtype=np.int64), slice(r.start-lo, stop, r.step)
+        return np.arange(lo, max(r.start, r[-1])+1, abs(r.step), dtype=np.int64), slice(None, None, 1 if r.step > 0 else -1)
+    if isinstance(key, (int, np.integer)):
+        idx = int(key)
+        if idx < -length or idx >= length:
+            raise IndexError('%s index %d is out of bounds for size %d'%(axisName, idx, length))
+        return np.array([idx % length],dtype=np.int64), 0
+    key = np.asarray(key)
+    if key.dtype == bool:
+        if key.shape != (length,):
+            raise IndexError('boolean %s index does not match size %d'%(axisName, length))
+        key = np.flatnonzero(key)
+    if key.dtype.kind not in 'iu':
+        raise IndexError('%s index must be an int, slice, or integer/boolean array'%(axisName))
+    key = key.astype(np.int64)
+    if key.size > 0 and (key.min() < -length or key.max() >= length):
+        raise IndexError('%s index out of bounds for size %d'%(axisName, length))
+    key = key % length if length > 0 else key
+    if key.size == 0:
+        return np.zeros(0,dtype=np.int64), key
+    if span:
+        lo = int(key.min())
+        return np.arange(lo, int(key.max())+1, dtype=np.int64), key-lo
+    unique, inverse = np.unique(key, return_inverse=True)
+    return unique, inverse.reshape(key.shape)
+
+#lazy, ndarray-like view of one roi: (frames, height, width) in the native pixel type
+#indexing reads only the requested frames and the span of rows they need, e.g. spe.Roi(0)[1000:2000:10, :, 200:300]
+class SpeArray:
+    def __init__(self, reference, roi: int):
+        self._reference = reference
+        self.roi = roi
+        self.shape = (int(reference.numFrames), int(reference.roiList[roi].height), int(reference.roiList[roi].width))
+        self.dtype = reference.dataType
+        self.ndim = 3
+
+    @property
+    def size(self):
+        return self.shape[0]*self.shape[1]*self.shape[2]
+
+    @property
+    def nbytes(self):
+        return self.size*self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return 'SpeArray(roi=%d, shape=%s, dtype=%s)'%(self.roi, self.shape, self.dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(item is Ellipsis for item in key):
+            pos = [i for i,item in enumerate(key) if item is Ellipsis]
+            if len(pos) > 1:
+                raise IndexError('an index can only have a single ellipsis')
+            key = key[:pos[0]] + (slice(None),)*(3-len(key)+1) + key[pos[0]+1:]
+        if len(key) > 3:
+            raise IndexError('too many indices for SpeArray: array is 3-dimensional, but %d were indexed'%(len(key)))
+        key = key + (slice(None),)*(3-len(key))
+        frames, frameKey = _AxisKey(key[0], self.shape[0], 'frame')
+        rows, rowKey = _AxisKey(key[1], self.shape[1], 'row', span=True)
+        if len(frames) == 0 or len(rows) == 0:
+            block = np.zeros((len(frames), len(rows), self.shape[2]), dtype=self.dtype)
+        else:
+            block = self._reference._ReadRoi(self.roi, frames, int(rows[0]), int(rows[-1])+1)
+        return block[frameKey, rowKey, key[2]]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __iter__(self):
+        for start, block in self.IterChunks():
+            for frame in block:
+                yield frame
+
+    #yields (first frame index, block of frames) so whole files can be walked without holding them in memory
+    def IterChunks(self, chunkFrames: int=64):
+        if chunkFrames < 1:
+            raise ValueError('chunkFrames must be at least 1')
+        for start in range(0, self.shape[0], chunkFrames):
+            yield start, self[start:start+chunkFrames]
+
+#background read-ahead for frame-by-frame access (slider scrubbing, stepping through frames in a script)
+#recent requests give the direction and stride, the next depth frames along that line are read on a worker thread
+#and held (all regions, native type) in a buffer of at most 2*depth frames. Started with SpeReference.StartPrefetch
+class SpePrefetcher:
+    def __init__(self, reference, *, depth: int=8):
+        if depth < 1:
+            raise ValueError('depth must be at least 1')
+        self.reference = reference
+        self.depth = depth
+        self.hits = 0
+        self.misses = 0
+        #last exception of the worker thread (also in SpeReference.IoStats), raised once by the next Get, which restarts the worker
+        self.error = None
+        self._raise = False
+        self._buffer = OrderedDict()
+        self._history = deque(maxlen=3)
+        self._stride = 1
+        #bumped on every request so the worker drops a stale plan between frames
+        self._generation = 0
+        self._stop = False
+        self._condition = threading.Condition()
+        self._Start()
+
+    def _Start(self):
+        self._thread = threading.Thread(target=self._Run, name='SpePrefetcher', daemon=True)
+        self._thread.start()
+
+    #frames as a list of per-roi arrays (frames, height, width) in the native type, reading whatever isn't buffered yet
+    def Get(self, rois, frames):
+        with self._condition:
+            if self._raise:
+                self._raise = False
+                self._thread.join()
+                self._Start()
+                raise self.error
+        allRois = list(range(0,len(self.reference.roiList)))
+        requested = [int(frame) for frame in frames]
+        if len(requested) == 0:
+            return [np.empty((0,int(self.reference.roiList[roi].height),int(self.reference.roiList[roi].width)), dtype=self.reference.dataType) for roi in rois]
+        with self._condition:
+            found = {frame: self._buffer[frame] for frame in requested if frame in self._buffer}
+        missingSet = set(requested)-set(found)
+        missing = np.array(sorted(missingSet), dtype=np.int64)
+        dataList = self.reference._ReadFrames(allRois, missing) if len(missing) > 0 else []
+        with self._condition:
+            misses = sum(1 for frame in requested if frame in missingSet)
+            self.hits += len(requested)-misses
+            self.misses += misses
+            #only the last 2*depth frames would stay in the buffer anyway, copies so a large read isn't kept alive by them
+            for k in range(max(0,len(missing)-2*self.depth),len(missing)):
+                self._Store(int(missing[k]), [data[k].copy() for data in dataList])
+            self._Record(requested[-1])
+            self._condition.notify()
+        if len(found) == 0 and len(missing) == len(requested) and np.array_equal(missing, requested):
+            return [dataList[roi] for roi in rois]
+        for k in range(0,len(missing)):
+            found[int(missing[k])] = [data[k] for data in dataList]
+        return [np.stack([found[frame][roi] for frame in requested]) for roi in rois]
+
+    #predicted stride is the last nonzero step between requests
+    def _Record(self, frame):
+        if len(self._history) > 0 and frame != self._history[-1]:
+            self._stride = frame-self._history[-1]
+        self._history.append(frame)
+        self._generation += 1
+
+    def _Store(self, frame, data):
+        self._buffer[frame] = data
+        self._buffer.move_to_end(frame)
+        while len(self._buffer) > 2*self.depth:
+            self._buffer.popitem(last=False)
+
+    def _Plan(self):
+        numFrames = int(self.reference.numFrames)
+        last = self._history[-1]
+        targets = [last+self._stride*i for i in range(1,self.depth+1)]
+        return [frame for frame in targets if 0 <= frame < numFrames and frame not in self._buffer]
+
+    def _Run(self):
+        allRois = list(range(0,len(self.reference.roiList)))
+        while True:
+            with self._condition:
+                while not self._stop and (len(self._history) == 0 or len(self._Plan()) == 0):
+                    self._condition.wait()
+                if self._stop:
+                    return
+                generation = self._generation
+                plan = self._Plan()
+            #one frame at a time, nearest first, so a new request can redirect the read-ahead quickly
+            for frame in plan:
+                try:
+                    dataList = self.reference._ReadFrames(allRois, [frame], cached=False)
+                except Exception as error:
+                    with self._condition:
+                        self.error = error
+                        self._raise = True
+                    return
+                with self._condition:
+                    self._Store(frame, [data[0] for data in dataList])
+                    if self._stop or generation != self._generation:
+                        break
+
+    def Stop(self):
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        self._thread.join()
+
+#works with spe3 and spe2.x (WinSpec) files, 2.x files have a single region and no footer
 class SpeReference():
     dataTypes = {'MonochromeUnsigned16':np.uint16, 'MonochromeUnsigned32':np.uint32, 'MonochromeFloating32':np.float32}
-    def __init__(self, filePath: str):
+    dataTypes2 = {0:np.float32, 1:np.int32, 2:np.int16, 3:np.uint16, 5:np.float64, 6:np.uint8, 8:np.uint32}
+    #header attributes that are persisted by SpeHeaderCache
+    headerFields = ('speVersion','xmlLoc','roiList','readoutStride','numFrames','pixelFormat','dataType','wavelength','sensorDims','metaList')
+    accessPatterns = ('normal', 'sequential', 'random')
+    #default largest single read per access pattern: streaming scans read in large blocks, random frame access in small ones
+    #so a request for a few frames doesn't pull in the readouts around them
+    blockSizes = {'normal': _MAX_READ, 'sequential': 128 << 20, 'random': 4 << 20}
+    def __init__(self, filePath: str, *, memmap: bool=False, headerCache=None, layout=None, frameCache=None,
+                 accessPattern: str='normal', blockSize: int=None, dropCache: bool=False):
+        if accessPattern not in self.accessPatterns:
+            raise ValueError('accessPattern must be one of %s'%(', '.join(self.accessPatterns)))
+        if blockSize is not None and blockSize < 1:
+            raise ValueError('blockSize must be at least 1')
         self.filePath = filePath
+        #finished spe file (path or SpeReference) with the same frame layout, used while this file is still being written
+        self.layout = layout
+        self.growing = False
         #self.filename = (self.filePath.rsplit('\\',maxsplit=1)[1]).rsplit(r'.',maxsplit=1)[0]
         #self.filedir = self.filePath.rsplit('\\',maxsplit=1)[0]
         #self.fileext = (self.filePath.rsplit('\\',maxsplit=1)[1]).rsplit(r'.',maxsplit=1)[1]        
@@ -160,116 +431,825 @@ class SpeReference():
         self.wavelength = []
         self.sensorDims = None
         self.metaList = []
-        self.xmlFooter = ''
-        self.InitializeSpe()
+        self._metadata = None
+        self.xmlLoc = 0
+        self._xmlFooter = ''
+        self._xmlIndex = None
+        self._settings = None
+        self.dataType = None
+        self.roiOffsets = []
+        self.offsetTable = np.zeros((0,0),dtype=np.int64)
+        self.memmap = memmap
+        self._mmap = None
+        self._roiViews = []
+        self._file = None
+        self._fileLock = threading.Lock()
+        self._readBuffer = None
+        #i/o tuning: hint given to the OS for the whole file (posix_fadvise, no effect where it is missing, e.g. Windows),
+        #largest single read and read budget of scans (default from blockSizes), and whether streaming scans drop the pages they
+        #have consumed from the page cache
+        self.accessPattern = accessPattern
+        self.blockSize = self.blockSizes[accessPattern] if blockSize is None else int(blockSize)
+        self.dropCache = dropCache
+        self.ioStats = {'bytes_read': 0, 'reads': 0, 'largest_read': 0}
+        self.prefetcher = None
+        #optional SpeFrameCache, used for whole-frame reads
+        self.frameCache = frameCache
+        if headerCache is not None:
+            state = headerCache.Get(filePath)
+            if state is not None:
+                self._SetHeaderState(state)
+            else:
+                self.InitializeSpe()
+                if not self.growing:
+                    headerCache.Put(filePath, self._GetHeaderState())
+        else:
+            self.InitializeSpe()
+
+    #footer text and index are only read/parsed on first use when the header came from a cache
+    @property
+    def xmlFooter(self):
+        if self._xmlFooter is None:
+            with open(self.filePath, encoding="utf8") as f:
+                f.seek(int(self.xmlLoc))
+                self._xmlFooter = f.read()
+        return self._xmlFooter
+
+    @xmlFooter.setter
+    def xmlFooter(self, value):
+        self._xmlFooter = value
+        self._xmlIndex = None
+
+    @property
+    def xmlIndex(self):
+        if self._xmlIndex is None:
+            self._xmlIndex = IndexFooter(self.xmlFooter)
+        return self._xmlIndex
+
+    def _GetHeaderState(self):
+        state = {name: getattr(self,name) for name in self.headerFields}
+        #the settings summary is stored instead of the full element index, which can be as large as the footer itself
+        state['settings'] = self.GetSettingsSummary()
+        return state
+
+    def _SetHeaderState(self, state):
+        for name in self.headerFields:
+            setattr(self, name, state[name])
+        self._settings = state['settings']
+        self._xmlFooter = None if self.speVersion == 3 else ''
+        self._InitializeLayout()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    #releases the file handle and memory map; views handed out by GetData/GetView keep their own reference to the map
+    def Close(self):
+        self.StopPrefetch()
+        with self._fileLock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._readBuffer = None
+        self._mmap = None
+        self._roiViews = []
+
+    #data reads share one handle, opened on first use and held until Close
+    def _File(self):
+        if self._file is None:
+            self._file = open(self.filePath,'rb')
+            if self.accessPattern != 'normal':
+                self._Advise(0, 0, self.accessPattern)
+        return self._file
+
+    _advice = {'normal':'POSIX_FADV_NORMAL', 'sequential':'POSIX_FADV_SEQUENTIAL', 'random':'POSIX_FADV_RANDOM',
+               'willneed':'POSIX_FADV_WILLNEED', 'dontneed':'POSIX_FADV_DONTNEED'}
+
+    #page cache hint for a byte range of the open file (length 0 = to the end), silently skipped where posix_fadvise is missing
+    def _Advise(self, offset, length, advice):
+        if self._file is None or not hasattr(os, 'posix_fadvise'):
+            return
+        try:
+            os.posix_fadvise(self._file.fileno(), int(offset), int(length), getattr(os, self._advice[advice]))
+        except OSError:
+            pass
+
+    #byte ranges (offset, length) of the reads _ReadFrames plans for whole regions of these frames, one per run,
+    #so hints cover what is actually read and not the readouts skipped between strided frames
+    def _FrameRuns(self, rois, frames):
+        bpp = self.dataType.itemsize
+        stride = int(self.readoutStride)
+        spanStart = min(self.roiOffsets[roi] for roi in rois)
+        spanStop = max(self.roiOffsets[roi] + int(self.roiList[roi].width)*int(self.roiList[roi].height)*bpp for roi in rois)
+        unique = np.unique(frames)
+        ranges = []
+        for first,last in _PlanRuns(unique, stride, spanStop-spanStart, maxRead=self.blockSize):
+            firstFrame = int(unique[first])
+            ranges.append((int(self.offsetTable[firstFrame,0]) + spanStart, (int(unique[last-1])-firstFrame)*stride + spanStop-spanStart))
+        return ranges
+
+    #bytes read from the file and read sizes so far (memmap access goes through the OS and isn't counted)
+    def IoStats(self):
+        with self._fileLock:
+            stats = dict(self.ioStats)
+        stats['mean_read'] = stats['bytes_read']/stats['reads'] if stats['reads'] > 0 else 0
+        stats['block_size'] = self.blockSize
+        stats['access_pattern'] = self.accessPattern
+        stats['prefetch_error'] = self.prefetcher.error if self.prefetcher is not None else None
+        return stats
+
+    def ResetIoStats(self):
+        with self._fileLock:
+            self.ioStats = {'bytes_read': 0, 'reads': 0, 'largest_read': 0}
 
     def InitializeSpe(self):
-        with open(self.filePath, encoding="utf8") as f:
-            f.seek(678)
-            self.xmlLoc = np.fromfile(f,dtype=np.uint64,count=1)[0]
-            f.seek(1992)
-            self.speVersion = np.fromfile(f,dtype=np.float32,count=1)[0]
-
-            #get ROIs and shapes
-            if self.speVersion==3:
-                f.seek(self.xmlLoc)
-                self.xmlFooter = f.read()
-                xmlRoot = ET.fromstring(self.xmlFooter)
-                for child in xmlRoot:
-                    if 'DataFormat'.casefold() in child.tag.casefold():
-                        for child1 in child:                    
-                            if 'DataBlock'.casefold() in child1.tag.casefold():
-                                self.readoutStride=np.uint64(child1.get('stride'))
-                                self.numFrames=np.uint64(child1.get('count'))
-                                self.pixelFormat=child1.get('pixelFormat')
-                                for child2 in child1:
-                                    if 'DataBlock'.casefold() in child1.tag.casefold():
-                                        regStride=np.int64(child2.get('stride'))
-                                        regWidth=np.int64(child2.get('width'))
-                                        regHeight=np.int64(child2.get('height'))
-                                        self.roiList.append(ROI(regWidth,regHeight,regStride))
-                    if 'MetaFormat'.casefold() in child.tag.casefold():
-                        for child1 in child:                    
-                            if 'MetaBlock'.casefold() in child1.tag.casefold():
-                                for child2 in child1:
-                                    metaType = child2.tag.rsplit('}',maxsplit=1)[1]
-                                    metaEvent = child2.get('event')
-                                    metaStride = np.int64(np.int64(child2.get('bitDepth'))/8)
-                                    metaResolution = child2.get('resolution')
-                                    if metaEvent != None and metaResolution !=None:
-                                        self.metaList.append(MetaContainer(metaType,metaStride,metaEvent=metaEvent,metaResolution=np.int64(metaResolution)))
-                                    else:
-                                        self.metaList.append(MetaContainer(metaType,metaStride))                                
-                    if 'Calibrations'.casefold() in child.tag.casefold():
-                        counter = 0
-                        for child1 in child:
-                            if 'WavelengthMapping'.casefold() in child1.tag.casefold():
-                                for child2 in child1:
-                                    if 'WavelengthError'.casefold() in child2.tag.casefold():
-                                        wavelengths = np.array([])
-                                        wlText = child2.text.rsplit()
-                                        for elem in wlText:
-                                            wavelengths = np.append(wavelengths,np.fromstring(elem,sep=',')[0])
-                                        self.wavelength = wavelengths
-                                    else:
-                                        self.wavelength = np.fromstring(child2.text,sep=',')
-                            if 'SensorInformation'.casefold() in child1.tag.casefold():
-                                width = np.uint32(child1.get('width'))
-                                height = np.uint32(child1.get('height'))
-                                self.sensorDims= ROI(width, height, 0)
-                            if 'SensorMapping'.casefold() in child1.tag.casefold():                                
-                                if counter < len(self.roiList):
-                                    self.roiList[counter].X = np.uint64(child1.get('x'))
-                                    self.roiList[counter].Y = np.uint64(child1.get('y'))
-                                    ogWidth = np.uint64(child1.get('width'))
-                                    ogHeight = np.uint64(child1.get('height'))
-                                    self.roiList[counter].xbin = np.uint64(child1.get('xBinning'))
-                                    self.roiList[counter].ybin = np.uint64(child1.get('yBinning'))
-                                    self.roiList[counter].width = np.uint64(ogWidth / self.roiList[counter].xbin)
-                                    self.roiList[counter].height = np.uint64(ogHeight / self.roiList[counter].ybin)
-                                    counter += 1
+        with open(self.filePath, 'rb') as f:
+            header = f.read(4100)
+        xmlLoc = np.frombuffer(header,dtype=np.uint64,count=1,offset=678)[0]
+        speVersion = np.frombuffer(header,dtype=np.float32,count=1,offset=1992)[0]
+        footer = ''
+        if speVersion==3 and xmlLoc != 0:
+            with open(self.filePath, encoding="utf8") as f:
+                f.seek(xmlLoc)
+                footer = f.read()
+        self._ParseHeader(header, footer)
+
+    #fills the layout from the 4100 byte header and the xml footer text (empty for spe2.x and files still being written)
+    def _ParseHeader(self, header: bytes, footer: str):
+        self.xmlLoc = np.frombuffer(header,dtype=np.uint64,count=1,offset=678)[0]
+        self.speVersion = np.frombuffer(header,dtype=np.float32,count=1,offset=1992)[0]
+        #get ROIs and shapes
+        if self.speVersion==3 and self.xmlLoc == 0:
+            #no footer yet, the file is still being acquired
+            self._AdoptLayout()
+        elif self.speVersion==3:
+            self.xmlFooter = footer
+            #footer is parsed and indexed once, settings queries are lookups into the index
+            xmlRoot = self.xmlIndex.root
+            for child in xmlRoot:
+                if 'DataFormat'.casefold() in child.tag.casefold():
+                    for child1 in child:                    
+                        if 'DataBlock'.casefold() in child1.tag.casefold():
+                            self.readoutStride=np.uint64(child1.get('stride'))
+                            self.numFrames=np.uint64(child1.get('count'))
+                            self.pixelFormat=child1.get('pixelFormat')
+                            for child2 in child1:
+                                if 'DataBlock'.casefold() in child1.tag.casefold():
+                                    regStride=np.int64(child2.get('stride'))
+                                    regWidth=np.int64(child2.get('width'))
+                                    regHeight=np.int64(child2.get('height'))
+                                    self.roiList.append(ROI(regWidth,regHeight,regStride))
+                if 'MetaFormat'.casefold() in child.tag.casefold():
+                    for child1 in child:                    
+                        if 'MetaBlock'.casefold() in child1.tag.casefold():
+                            for child2 in child1:
+                                metaType = child2.tag.rsplit('}',maxsplit=1)[1]
+                                metaEvent = child2.get('event')
+                                metaStride = np.int64(child2.get('bitDepth'))//8
+                                metaResolution = child2.get('resolution')
+                                metaDataType = child2.get('type',default='')
+                                metaComponent = child2.get('component',default='')
+                                if metaEvent != None and metaResolution !=None:
+                                    self.metaList.append(MetaContainer(metaType,metaStride,metaEvent=metaEvent,metaResolution=np.int64(metaResolution),
+                                                                       metaDataType=metaDataType,metaComponent=metaComponent))
                                 else:
-                                    break        
-    
-    def GetData(self,*,rois:list=[], frames:list=[]):
+                                    self.metaList.append(MetaContainer(metaType,metaStride,metaDataType=metaDataType,metaComponent=metaComponent))                                
+                if 'Calibrations'.casefold() in child.tag.casefold():
+                    counter = 0
+                    for child1 in child:
+                        if 'WavelengthMapping'.casefold() in child1.tag.casefold():
+                            for child2 in child1:
+                                if 'WavelengthError'.casefold() in child2.tag.casefold():
+                                    wavelengths = np.array([])
+                                    wlText = child2.text.rsplit()
+                                    for elem in wlText:
+                                        wavelengths = np.append(wavelengths,np.fromstring(elem,sep=',')[0])
+                                    self.wavelength = wavelengths
+                                else:
+                                    self.wavelength = np.fromstring(child2.text,sep=',')
+                        if 'SensorInformation'.casefold() in child1.tag.casefold():
+                            width = np.uint32(child1.get('width'))
+                            height = np.uint32(child1.get('height'))
+                            self.sensorDims= ROI(width, height, 0)
+                        if 'SensorMapping'.casefold() in child1.tag.casefold():                                
+                            if counter < len(self.roiList):
+                                self.roiList[counter].X = np.uint64(child1.get('x'))
+                                self.roiList[counter].Y = np.uint64(child1.get('y'))
+                                ogWidth = np.uint64(child1.get('width'))
+                                ogHeight = np.uint64(child1.get('height'))
+                                self.roiList[counter].xbin = np.uint64(child1.get('xBinning'))
+                                self.roiList[counter].ybin = np.uint64(child1.get('yBinning'))
+                                self.roiList[counter].width = np.uint64(ogWidth // self.roiList[counter].xbin)
+                                self.roiList[counter].height = np.uint64(ogHeight // self.roiList[counter].ybin)
+                                counter += 1
+                            else:
+                                break
+        #spe2.x: fixed header fields describe one region, frames follow the header back to back
+        elif self.speVersion < 3:
+            datatype = np.frombuffer(header,dtype=np.int16,count=1,offset=108)[0]
+            if datatype not in self.dataTypes2:
+                raise ValueError('Unsupported spe2.x data type %d'%(datatype))
+            self.dataType = np.dtype(self.dataTypes2[datatype])
+            frameWidth = np.int64(np.frombuffer(header,dtype=np.uint16,count=1,offset=42)[0])
+            frameHeight = np.int64(np.frombuffer(header,dtype=np.uint16,count=1,offset=656)[0])
+            self.numFrames = np.uint64(np.frombuffer(header,dtype=np.int32,count=1,offset=1446)[0])
+            regStride = np.int64(frameWidth*frameHeight*self.dataType.itemsize)
+            self.roiList.append(ROI(frameWidth,frameHeight,regStride))
+            self.readoutStride = np.uint64(regStride)
+        self._InitializeLayout()
+
+    #takes the frame layout from self.layout and counts the readouts already complete on disk
+    def _AdoptLayout(self):
+        if self.layout is None:
+            raise ValueError('%s has no xml footer yet (still being written?), pass layout= a finished file with the same frame layout'%(self.filePath))
+        layout = self.layout if isinstance(self.layout, SpeReference) else SpeReference(self.layout)
+        for name in ('roiList','readoutStride','pixelFormat','dataType','wavelength','sensorDims','metaList'):
+            setattr(self, name, list(getattr(layout, name)) if name in ('roiList','metaList') else getattr(layout, name))
+        self.growing = True
+        self.numFrames = np.uint64(self._CompleteFrames())
+
+    def _CompleteFrames(self):
+        return max(0, (os.path.getsize(self.filePath)-4100)//int(self.readoutStride))
+
+    #for a file that is still being written: picks up frames that have landed since the last call,
+    #or re-reads the header from the footer once the writer has finished. Returns the frame count
+    def Refresh(self):
+        if not self.growing:
+            return int(self.numFrames)
+        with open(self.filePath,'rb') as f:
+            f.seek(678)
+            xmlLoc = int(np.fromfile(f,dtype=np.uint64,count=1)[0])
+        if xmlLoc != 0:
+            self.growing = False
+            self.roiList = []
+            self.metaList = []
+            self.wavelength = []
+            self.sensorDims = None
+            self.pixelFormat = None
+            self.dataType = None
+            self._metadata = None
+            self._settings = None
+            self._mmap = None
+            self._roiViews = []
+            self.InitializeSpe()
+        else:
+            numFrames = self._CompleteFrames()
+            if numFrames != int(self.numFrames):
+                self.numFrames = np.uint64(numFrames)
+                self._metadata = None
+                self._mmap = None
+                self._roiViews = []
+                self._InitializeLayout()
+        return int(self.numFrames)
+
+    #generator that yields (frame indices, list of roi arrays) as frames are written to the file, oldest first
+    #ends once the writer has finished and every frame was yielded, or after timeout seconds without a new frame
+    #usage while LightField (or SpeWriter) is acquiring: for idx, data in SpeReference(newFile, layout=oldFile).FollowFrames(timeout=30):
+    def FollowFrames(self,*,rois:list=[], startFrame: int=0, chunkFrames: int=64, pollInterval: float=0.05, timeout: float=None):
+        if len(rois) == 0:
+            rois = np.arange(0,len(self.roiList))
+        self._CheckRois(rois)
+        if chunkFrames < 1:
+            raise ValueError('chunkFrames must be at least 1')
+        nextFrame = startFrame
+        lastFrameTime = time.monotonic()
+        while True:
+            available = self.Refresh()
+            if available > nextFrame:
+                stop = min(available, nextFrame+chunkFrames)
+                frames = np.arange(nextFrame,stop,dtype=np.int64)
+                yield frames, self._ReadFrames(rois, frames, cached=False)
+                nextFrame = stop
+                lastFrameTime = time.monotonic()
+                continue
+            if not self.growing:
+                return
+            if timeout is not None and time.monotonic()-lastFrameTime > timeout:
+                return
+            time.sleep(pollInterval)
+
+    #pixel type and byte offsets derived from the parsed header
+    def _InitializeLayout(self):
+        self.roiOffsets = []
+        if self.pixelFormat is not None:
+            self.dataType = np.dtype(self.dataTypes[self.pixelFormat])
+        if self.dataType is not None:
+            #byte offset of each region inside a readout
+            offset = 0
+            for roi in self.roiList:
+                self.roiOffsets.append(offset)
+                offset += int(roi.stride)
+            #absolute byte offset of every (frame, roi) pair, used to plan reads
+            self.offsetTable = 4100 + np.arange(0,int(self.numFrames),dtype=np.int64)[:,None]*int(self.readoutStride) + np.array(self.roiOffsets,dtype=np.int64)[None,:]
+
+    #maps the data block once, each roi becomes a strided (frames, height, width) window into the same map
+    #nothing is read from disk until a view is indexed, so this is cheap regardless of file size
+    def _MapData(self):
+        if self._mmap is not None:
+            return
+        dataSize = int(self.numFrames)*int(self.readoutStride)
+        if dataSize > 0:
+            self._mmap = np.memmap(self.filePath, dtype=np.uint8, mode='r', offset=4100, shape=(dataSize,))
+        else:
+            self._mmap = np.zeros(0, dtype=np.uint8)
+        bpp = self.dataType.itemsize
+        for i in range(0,len(self.roiList)):
+            width = int(self.roiList[i].width)
+            height = int(self.roiList[i].height)
+            self._roiViews.append(np.ndarray((int(self.numFrames),height,width), dtype=self.dataType, buffer=self._mmap,
+                                             offset=self.roiOffsets[i], strides=(int(self.readoutStride),width*bpp,bpp)))
+
+    def GetView(self, roi: int=0):
+        if roi < 0 or roi >= len(self.roiList):
+            raise ValueError('ROI value outside of allowed ranged (%d through %d)'%(0, len(self.roiList)-1))
+        self._MapData()
+        return self._roiViews[roi]
+
+    #lazy array over one roi, see SpeArray
+    def Roi(self, roi: int=0):
+        if roi < 0 or roi >= len(self.roiList):
+            raise ValueError('ROI value outside of allowed ranged (%d through %d)'%(0, len(self.roiList)-1))
+        return SpeArray(self, roi)
+
+    #time series of single pixels, rows or columns, read through the mapped data block so only the pages holding the
+    #requested pixels are touched (memmap=True is not needed). Results are copies in the native pixel type, frames first
+    #GetPixelTrace(roi, y, x) --> (frames,), y and x can also be equal-length lists --> (frames, n)
+    def GetPixelTrace(self, roi: int, y, x, *, frames:list=[]):
+        y = np.asarray(y, dtype=np.int64)
+        x = np.asarray(x, dtype=np.int64)
+        if y.shape != x.shape or y.ndim > 1:
+            raise ValueError('y and x must be integers or lists of the same length')
+        self._CheckPixels(roi, y, 'height', 'y')
+        self._CheckPixels(roi, x, 'width', 'x')
+        return self._Trace(roi, frames, y, x)
+
+    #(frames, width) for row y
+    def GetRowTrace(self, roi: int, y: int, *, frames:list=[]):
+        self._CheckPixels(roi, np.asarray(y, dtype=np.int64), 'height', 'y')
+        return self._Trace(roi, frames, int(y), slice(None))
+
+    #(frames, height) for column x
+    def GetColumnTrace(self, roi: int, x: int, *, frames:list=[]):
+        self._CheckPixels(roi, np.asarray(x, dtype=np.int64), 'width', 'x')
+        return self._Trace(roi, frames, slice(None), int(x))
+
+    def _CheckPixels(self, roi, values, axis, name):
+        self._CheckRois([roi])
+        length = int(getattr(self.roiList[roi], axis))
+        if values.size > 0 and (values.min() < 0 or values.max() >= length):
+            raise ValueError('%s value outside of allowed ranged (%d through %d)'%(name, 0, length-1))
+
+    def _Trace(self, roi, frames, y, x):
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        frames = self._CheckFrames(frames)
+        view = self.GetView(roi)
+        frameSlice = _FramesAsSlice(frames)
+        if isinstance(y, np.ndarray) and y.ndim == 1:
+            if frameSlice is not None:
+                return np.array(view[frameSlice][:,y,x])
+            return view[frames[:,None],y[None,:],x[None,:]]
+        if frameSlice is not None:
+            return np.array(view[frameSlice,y,x])
+        return view[frames,y,x]
+
+    #reads rows [rowStart, rowStop) of one roi for each listed frame, in the native pixel type
+    def _ReadRoi(self, roi, frames, rowStart, rowStop):
+        frames = np.asarray(frames,dtype=np.int64)
+        if self.memmap:
+            self._MapData()
+            return np.array(self._roiViews[roi][frames,rowStart:rowStop])
+        return self._ReadFrames([roi], frames, rowStart=rowStart, rowStop=rowStop)[0]
+
+    #binning=(ybin, xbin) sums (binMode='sum') or averages (binMode='mean') blocks of pixels while reading, frameStep=k keeps every k-th frame
+    #rows/columns that don't fill a whole bin are dropped, binned sums come back as int64 (integer data) or float64
+    #dtype=None keeps the native pixel type, the default 'auto' is float64 for file reads and the native type (views) with memmap=True;
+    #any other dtype gives arrays of that type in both modes. out=[arrays] (one (frames, height, width) array per roi) is filled in place
+    #and returned, so a loop re-reading the same number of frames doesn't allocate. All requested rois are filled from one pass over the readouts
+    #cached=False bypasses the frameCache for this call (one-off scans that shouldn't displace the frames kept for repeated reads)
+    def GetData(self,*,rois:list=[], frames:list=[], binning=None, frameStep: int=1, binMode: str='sum', dtype='auto', out: list=None, cached: bool=True):
         #if no inputs, or empty list, set to all
         if len(rois) == 0:
             rois = np.arange(0,len(self.roiList))
         if len(frames) == 0:
             frames = np.arange(0,self.numFrames)
         #check for improper values, raise exception if necessary
+        self._CheckRois(rois)
+        frames = self._CheckFrames(frames)
+        if frameStep < 1:
+            raise ValueError('frameStep must be at least 1')
+        frames = frames[::frameStep]
+        if binning is not None:
+            if out is not None:
+                raise ValueError('out is not supported with binning')
+            return self._ReadBinned(rois, frames, binning, binMode)
+        if out is not None:
+            self._CheckOut(rois, frames, out)
+        if isinstance(dtype, str) and dtype == 'auto':
+            dtype = None if self.memmap else np.float64
+
+        if self.memmap:
+            self._MapData()
+            frameSlice = _FramesAsSlice(frames)
+            if out is not None:
+                for k,item in enumerate(rois):
+                    np.copyto(out[k], self._roiViews[item][frameSlice if frameSlice is not None else frames], casting='unsafe')
+                return out
+            if frameSlice is not None:
+                dataList = [self._roiViews[item][frameSlice] for item in rois]
+            else:
+                #arbitrary frame lists can't be expressed as a view, only the requested frames get copied
+                dataList = [self._roiViews[item][frames] for item in rois]
+            #views only when the native type is wanted
+            return dataList if dtype is None or np.dtype(dtype) == self.dataType else [data.astype(dtype) for data in dataList]
+
+        #now with that out of the way... get the data
+        if self.prefetcher is not None:
+            dataList = self.prefetcher.Get(rois, frames)
+            if out is not None:
+                for k in range(0,len(rois)):
+                    np.copyto(out[k], dataList[k], casting='unsafe')
+                return out
+            return dataList if dtype is None else [data.astype(dtype) for data in dataList]
+        dataList = self._ReadFrames(rois, frames, dtype=dtype, cached=cached, out=out)
+        return dataList if out is None else out
+
+    def _CheckOut(self, rois, frames, out):
+        if len(out) != len(rois):
+            raise ValueError('out needs one array per ROI (%d), got %d'%(len(rois), len(out)))
+        for item,data in zip(rois, out):
+            shape = (len(frames),int(self.roiList[item].height),int(self.roiList[item].width))
+            if not isinstance(data, np.ndarray) or data.shape != shape:
+                raise ValueError('out array for ROI %d must be a numpy array of shape %s'%(item, shape))
+
+    #GetData calls are served from a read-ahead buffer filled by a background thread (see SpePrefetcher)
+    #hit/miss counts are in spe.prefetcher.hits / spe.prefetcher.misses. Not used with memmap=True, where the OS already reads ahead
+    def StartPrefetch(self, depth: int=8):
+        self.StopPrefetch()
+        if not self.memmap:
+            self.prefetcher = SpePrefetcher(self, depth=depth)
+        return self.prefetcher
+
+    def StopPrefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.Stop()
+            self.prefetcher = None
+
+    #reads in bands of whole bins (at most blockSize bytes each) and reduces each band before the next, so the unbinned data is never held at once
+    def _ReadBinned(self, rois, frames, binning, binMode):
+        if isinstance(binning, (int, np.integer)):
+            binning = (binning, binning)
+        ybin, xbin = (int(item) for item in binning)
+        if ybin < 1 or xbin < 1:
+            raise ValueError('binning factors must be at least 1')
+        if binMode not in ('sum', 'mean'):
+            raise ValueError('binMode must be sum or mean')
+        if binMode == 'mean':
+            outType = np.float64
+        else:
+            outType = np.int64 if np.issubdtype(self.dataType, np.integer) else np.float64
+        if self.memmap:
+            self._MapData()
+        bpp = self.dataType.itemsize
+        dataList = []
+        for roi in rois:
+            width = int(self.roiList[roi].width)
+            outHeight = int(self.roiList[roi].height)//ybin
+            outWidth = width//xbin
+            binned = np.empty((len(frames),outHeight,outWidth), dtype=outType)
+            dataList.append(binned)
+            if binned.size == 0:
+                continue
+            #frames per chunk and bins per row band, sized to the read budget
+            bandBytes = ybin*width*bpp
+            chunkFrames = int(max(1, min(len(frames), self.blockSize//(outHeight*bandBytes))))
+            bandBins = int(max(1, min(outHeight, self.blockSize//(chunkFrames*bandBytes))))
+            for start in range(0,len(frames),chunkFrames):
+                batch = frames[start:start+chunkFrames]
+                for binStart in range(0,outHeight,bandBins):
+                    binStop = min(outHeight, binStart+bandBins)
+                    rowStart = binStart*ybin
+                    rowStop = binStop*ybin
+                    if self.memmap:
+                        band = self._roiViews[roi][batch,rowStart:rowStop,:outWidth*xbin]
+                    else:
+                        band = self._ReadFrames([roi], batch, rowStart=rowStart, rowStop=rowStop)[0][:,:,:outWidth*xbin]
+                    band = band.reshape(len(batch),binStop-binStart,ybin,outWidth,xbin)
+                    if binMode == 'mean':
+                        binned[start:start+len(batch),binStart:binStop] = band.mean(axis=(2,4), dtype=np.float64)
+                    else:
+                        binned[start:start+len(batch),binStart:binStop] = band.sum(axis=(2,4), dtype=outType)
+        return dataList
+
+    #generator over frames in batches of at most chunkFrames, yields (frame indices, list of roi arrays in native type)
+    #each batch is fetched with large sequential reads and only one batch is held at a time, so memory stays bounded for any file size
+    def IterFrames(self,*,rois:list=[], frames:list=[], chunkFrames: int=64):
+        if len(rois) == 0:
+            rois = np.arange(0,len(self.roiList))
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        self._CheckRois(rois)
+        frames = self._CheckFrames(frames)
+        if chunkFrames < 1:
+            raise ValueError('chunkFrames must be at least 1')
+        #a scan asks the OS to read the next batch ahead while the current one is processed,
+        #and with dropCache releases the batches it is done with so a pass over a huge file doesn't push everything else out of the page cache
+        for start in range(0,len(frames),chunkFrames):
+            batch = frames[start:start+chunkFrames]
+            dataList = self._ReadFrames(rois, batch, cached=False)
+            with self._fileLock:
+                if start+chunkFrames < len(frames):
+                    for offset,length in self._FrameRuns(rois, frames[start+chunkFrames:start+2*chunkFrames]):
+                        self._Advise(offset, length, 'willneed')
+                if self.dropCache and not self.memmap:
+                    for offset,length in self._FrameRuns(rois, batch):
+                        self._Advise(offset, length, 'dontneed')
+            yield batch, dataList
+
+    reduceOps = ('sum', 'mean', 'var', 'std', 'min', 'max', 'median')
+
+    #per-pixel reduction over the frame axis, returns one (height, width) image per roi
+    #op: sum (int64 for integer data, float64 otherwise), mean, var, std (float64, ddof as in numpy), min, max (native type), median (exact)
+    #the file is streamed chunkFrames at a time; mean/var merge per-chunk means and squared deviations (Chan/Welford), so 10k-frame darks
+    #and noise maps need memory for a few images, not the stack. median needs every frame of a pixel, it goes through row bands instead
+    #medianBytes is the memory the exact median may use for its row bands: a stack that fits is read in one pass, larger ones in
+    #about (stack size / medianBytes) passes
+    def Reduce(self, op: str, *, rois:list=[], frames:list=[], chunkFrames: int=64, ddof: int=0, medianBytes: int=1<<30):
+        if op not in self.reduceOps:
+            raise ValueError('op must be one of %s'%(', '.join(self.reduceOps)))
+        if len(rois) == 0:
+            rois = np.arange(0,len(self.roiList))
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        self._CheckRois(rois)
+        frames = self._CheckFrames(frames)
+        if len(frames) == 0:
+            raise ValueError('no frames to reduce')
+        if chunkFrames < 1:
+            raise ValueError('chunkFrames must be at least 1')
+        if op == 'median':
+            if medianBytes < 1:
+                raise ValueError('medianBytes must be at least 1')
+            return [self._MedianImage(roi, frames, chunkFrames, medianBytes) for roi in rois]
+        sumType = np.int64 if np.issubdtype(self.dataType, np.integer) else np.float64
+        results = [None]*len(rois)
+        m2s = [None]*len(rois)
+        count = 0
+        for batch, dataList in self.IterFrames(rois=rois, frames=frames, chunkFrames=chunkFrames):
+            n = len(batch)
+            for k,data in enumerate(dataList):
+                if op == 'sum':
+                    part = data.sum(axis=0, dtype=sumType)
+                    results[k] = part if results[k] is None else results[k]+part
+                elif op == 'min':
+                    part = data.min(axis=0)
+                    results[k] = part if results[k] is None else np.minimum(results[k], part)
+                elif op == 'max':
+                    part = data.max(axis=0)
+                    results[k] = part if results[k] is None else np.maximum(results[k], part)
+                else:
+                    mean = data.mean(axis=0, dtype=np.float64)
+                    m2 = None
+                    if op != 'mean':
+                        m2 = ((data-mean)**2).sum(axis=0)
+                    if results[k] is None:
+                        results[k] = mean
+                        m2s[k] = m2
+                        continue
+                    #merge the chunk into the running mean / sum of squared deviations
+                    delta = mean-results[k]
+                    total = count+n
+                    results[k] += delta*(n/total)
+                    if m2 is not None:
+                        m2s[k] += m2 + delta**2*(count*n/total)
+            count += len(batch)
+        if op in ('var', 'std'):
+            if count-ddof <= 0:
+                raise ValueError('ddof must be smaller than the number of frames')
+            results = [m2/(count-ddof) for m2 in m2s]
+            if op == 'std':
+                results = [np.sqrt(var) for var in results]
+        return results
+
+    #exact per-pixel median: all requested frames for a band of rows are gathered (at most medianBytes), then reduced
+    #bands are as tall as the budget allows, and the rest of each readout is read through when it is no larger than the band,
+    #so every pass over the file is made of large sequential reads rather than a few rows per readout
+    def _MedianImage(self, roi, frames, chunkFrames, medianBytes):
+        height = int(self.roiList[roi].height)
+        width = int(self.roiList[roi].width)
+        median = np.empty((height,width), dtype=np.float64)
+        rowBytes = len(frames)*width*self.dataType.itemsize
+        bandRows = int(max(1, min(height, medianBytes//max(1,rowBytes))))
+        maxGap = max(_COALESCE_GAP, bandRows*width*self.dataType.itemsize)
+        band = np.empty((len(frames),bandRows,width), dtype=self.dataType)
+        for rowStart in range(0,height,bandRows):
+            rowStop = min(height, rowStart+bandRows)
+            rows = band[:,:rowStop-rowStart]
+            for start in range(0,len(frames),chunkFrames):
+                self._ReadFrames([roi], frames[start:start+chunkFrames], rowStart=rowStart, rowStop=rowStop, maxGap=maxGap, out=[rows[start:start+chunkFrames]])
+            median[rowStart:rowStop] = np.median(rows, axis=0)
+        return median
+
+    def _CheckRois(self, rois):
         try:
             for item in rois:
                 if item < 0 or item >= len(self.roiList):
                     raise ValueError('ROI value outside of allowed ranged (%d through %d)'%(0, len(self.roiList)-1))
         except TypeError:
             raise TypeError('ROI input needs to be iterable')
+
+    #validates a frame list in one vectorized pass, returns it as an int64 array
+    def _CheckFrames(self, frames):
         try:
-            for item in frames:
-                if item < 0 or item >= self.numFrames:
-                    raise ValueError('Frame value outside of allowed ranged (%d through %d)'%(0, self.numFrames-1))
+            iter(frames)
         except TypeError:
             raise TypeError('Frame input needs to be iterable')
+        frames = np.asarray(frames)
+        if frames.size > 0 and frames.dtype.kind not in 'iu':
+            if not np.all(np.mod(frames, 1) == 0):
+                raise TypeError('Frame values need to be integers')
+        frames = frames.astype(np.int64).ravel()
+        if frames.size > 0 and (frames.min() < 0 or frames.max() >= int(self.numFrames)):
+            raise ValueError('Frame value outside of allowed ranged (%d through %d)'%(0, int(self.numFrames)-1))
+        return frames
 
-        #now with that out of the way... get the data
-        regionOffset=0
-        dataList=list()
-        with open(self.filePath, encoding="utf8") as f:            
-            bpp = np.dtype(self.dataTypes[self.pixelFormat]).itemsize            
-            for i in range(0,len(rois)):                
-                regionData = np.zeros([len(frames),self.roiList[rois[i]].height, self.roiList[rois[i]].width])
-                regionOffset = 0                
-                if rois[i]>0:
-                    for ii in range(0,rois[i]):
-                        regionOffset += np.uint64(self.roiList[ii].stride/bpp)                    
-                for j in range(0,len(frames)):
-                    f.seek(0)                    
-                    frameOffset = np.uint64(frames[j]*self.readoutStride/bpp)
-                    readCount =  np.uint64(self.roiList[rois[i]].stride/bpp)
-                    tmp = np.fromfile(f,dtype=self.dataTypes[self.pixelFormat],count=readCount,offset=np.uint64(4100+(regionOffset*bpp)+(frameOffset*bpp)))
-                    regionData[j,:] = np.reshape(tmp,[self.roiList[rois[i]].height,self.roiList[rois[i]].width])
-                dataList.append(regionData)
+    #reads the listed frames for each roi (optionally only rows [rowStart, rowStop)) with as few large reads as possible
+    #frames are sorted and deduplicated, neighbours closer than maxGap bytes share one read, results are scattered back in request order
+    def _ReadFrames(self, rois, frames, *, rowStart: int=0, rowStop: int=None, dtype=None, maxGap: int=None, maxRead: int=None, cached: bool=True, out: list=None):
+        frames = np.asarray(frames,dtype=np.int64)
+        dtype = self.dataType if dtype is None else dtype
+        if cached and self.frameCache is not None and rowStart == 0 and rowStop is None:
+            return self._ReadCached(rois, frames, dtype, out)
+        bpp = self.dataType.itemsize
+        stride = int(self.readoutStride)
+        shapes = []
+        segments = []
+        for roi in rois:
+            width = int(self.roiList[roi].width)
+            stop = int(self.roiList[roi].height) if rowStop is None else rowStop
+            shapes.append((stop-rowStart, width))
+            segments.append(self.roiOffsets[roi] + rowStart*width*bpp)
+        dataList = out if out is not None else [np.empty((len(frames),)+shape, dtype=dtype) for shape in shapes]
+        if len(frames) == 0 or all(shape[0]*shape[1] == 0 for shape in shapes):
+            return dataList
+        #byte span inside a readout covering every requested region
+        spanStart = min(segments)
+        spanStop = max(segments[k] + shapes[k][0]*shapes[k][1]*bpp for k in range(0,len(shapes)))
+        unique, inverse = np.unique(frames, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        counts = np.bincount(inverse, minlength=len(unique))
+        starts = np.concatenate(([0], np.cumsum(counts)))
+        #increasing frame lists (the usual case) are copied run by run without an index gather
+        increasing = len(unique) == len(frames) and bool(np.all(np.diff(frames) > 0))
+        if maxRead is None:
+            maxRead = self.blockSize
+        runs = _PlanRuns(unique, stride, spanStop-spanStart, maxGap=_COALESCE_GAP if maxGap is None else maxGap, maxRead=maxRead)
+        with self._fileLock:
+            f = self._File()
+            for first,last in runs:
+                firstFrame = int(unique[first])
+                numReadouts = int(unique[last-1])-firstFrame+1
+                buffer = self._ReadBuffer((numReadouts-1)*stride + spanStop-spanStart)
+                offset = int(self.offsetTable[firstFrame,0]) + spanStart
+                f.seek(offset)
+                #a truncated file would leave bytes of the previous read in the reused buffer
+                count = f.readinto(buffer)
+                if count != buffer.size:
+                    raise EOFError('%s: expected %d bytes at offset %d, got %d (truncated file?)'%(self.filePath, buffer.size, offset, count or 0))
+                self.ioStats['bytes_read'] += buffer.size
+                self.ioStats['reads'] += 1
+                self.ioStats['largest_read'] = max(self.ioStats['largest_read'], buffer.size)
+                source = unique[first:last]-firstFrame
+                if not increasing:
+                    source = np.repeat(source, counts[first:last])
+                positions = order[starts[first]:starts[last]]
+                for k in range(0,len(shapes)):
+                    view = np.ndarray((numReadouts,)+shapes[k], dtype=self.dataType, buffer=buffer,
+                                      offset=segments[k]-spanStart, strides=(stride,shapes[k][1]*bpp,bpp))
+                    if increasing and numReadouts == last-first:
+                        dataList[k][first:last] = view
+                    elif increasing:
+                        dataList[k][first:last] = view[source]
+                    else:
+                        dataList[k][positions] = view[source]
         return dataList
+
+    #whole-frame reads through the frame cache, frames missing from it are read in one planned pass
+    #and stored only if the read is at most cache.admitBytes, so a large or streaming request doesn't flush the cache
+    def _ReadCached(self, rois, frames, dtype, out):
+        cache = self.frameCache
+        fileKey = SpeFrameCache.FileKey(self.filePath)
+        keys = [(int(roi), int(frame)) for roi in rois for frame in frames]
+        found = cache.GetMany(fileKey, keys)
+        dataList = []
+        missing = set()
+        for k,roi in enumerate(rois):
+            if out is not None:
+                data = out[k]
+            else:
+                data = np.empty((len(frames),int(self.roiList[roi].height),int(self.roiList[roi].width)), dtype=dtype)
+            for i in range(0,len(frames)):
+                cached = found[k*len(frames)+i]
+                if cached is None:
+                    missing.add(int(frames[i]))
+                else:
+                    data[i] = cached
+            dataList.append(data)
+        if len(missing) == 0:
+            return dataList
+        missing = np.array(sorted(missing), dtype=np.int64)
+        readList = self._ReadFrames(rois, missing, cached=False)
+        positions = np.searchsorted(missing, frames)
+        hit = positions < len(missing)
+        hit[hit] = missing[positions[hit]] == frames[hit]
+        for k in range(0,len(rois)):
+            dataList[k][hit] = readList[k][positions[hit]]
+        if sum(data.nbytes for data in readList) <= cache.admitBytes:
+            cache.PutMany(fileKey, [((int(roi), int(missing[j])), readList[k][j]) for k,roi in enumerate(rois) for j in range(0,len(missing))])
+        return dataList
+
+    #scratch buffer for raw reads, kept between calls and only grown, so repeated reads of similar size don't allocate
+    #callers hold _fileLock, the contents are only valid until the next read
+    def _ReadBuffer(self, nbytes):
+        if self._readBuffer is None or self._readBuffer.size < nbytes:
+            self._readBuffer = np.empty(nbytes, dtype=np.uint8)
+        return self._readBuffer[:nbytes]
+
+    #numpy type of each per-frame metadata entry, keyed by the type attribute in MetaFormat (bitDepth is the fallback)
+    metaTypes = {'Int8':'<i1', 'UInt8':'<u1', 'Int16':'<i2', 'UInt16':'<u2', 'Int32':'<i4', 'UInt32':'<u4', 'Int64':'<i8', 'UInt64':'<u8',
+                 'Single':'<f4', 'Float':'<f4', 'Double':'<f8'}
+
+    #layout of the metadata that follows the regions in each readout, as a structured type spanning the whole readout
+    #field names are the timestamp event (ExposureStarted/ExposureEnded), or the tag plus component (GateTrackingDelay, GateTrackingWidth)
+    def _MetaLayout(self):
+        names = []
+        formats = []
+        offsets = []
+        offset = self.roiOffsets[-1] + int(self.roiList[-1].stride) if len(self.roiList) > 0 else 0
+        for meta in self.metaList:
+            if meta.metaEvent:
+                name = meta.metaEvent
+            else:
+                name = meta.metaType + (meta.metaComponent or '')
+            while name in names:
+                name += '_'
+            names.append(name)
+            formats.append(self.metaTypes.get(meta.metaDataType, '<i%d'%(int(meta.stride))))
+            offsets.append(offset)
+            offset += int(meta.stride)
+        return np.dtype({'names':names, 'formats':formats, 'offsets':offsets, 'itemsize':int(self.readoutStride)})
+
+    def GetMetadata(self,*,frames:list=[]):
+        '''
+        Decode per-frame metadata into a structured array, one record per frame
+        Timestamps are converted to seconds with their resolution, other entries keep their stored values
+        Returns [] if the file has no metadata
+        '''
+        if len(self.metaList) == 0:
+            return []
+        if len(frames) == 0 and self._metadata is not None:
+            return self._metadata
+        layout = self._MetaLayout()
+        outNames = ['frame']
+        outFormats = [np.int64]
+        for name,meta in zip(layout.names,self.metaList):
+            outNames.append(name)
+            outFormats.append(np.float64 if meta.metaResolution else layout.fields[name][0])
+        raw = self._MetaRecords(layout)
+        index = np.arange(0,int(self.numFrames),dtype=np.int64) if len(frames) == 0 else self._CheckFrames(frames)
+        metadata = np.zeros(len(index), dtype={'names':outNames, 'formats':outFormats})
+        metadata['frame'] = index
+        for name,meta in zip(layout.names,self.metaList):
+            values = raw[name] if len(frames) == 0 else raw[name][index]
+            if meta.metaResolution:
+                metadata[name] = values/np.float64(meta.metaResolution)
+            else:
+                metadata[name] = values
+        del raw
+        if len(frames) == 0:
+            self._metadata = metadata
+        return metadata
+
+    #one record per readout with the metadata fields of layout
+    #one strided pass over the data block per field, only the metadata bytes of each readout are touched
+    def _MetaRecords(self, layout):
+        return np.memmap(self.filePath, dtype=layout, mode='r', offset=4100, shape=(int(self.numFrames),))
+
+    #frames whose timestamp (in seconds) falls in [t0, t1), found by binary search over the decoded timestamps
+    def GetFramesInTimeRange(self, t0: float, t1: float, *, event: str='ExposureStarted'):
+        metadata = self.GetMetadata()
+        if len(metadata) == 0 or event not in metadata.dtype.names:
+            raise ValueError('No %s timestamps in this spe file'%(event))
+        times = metadata[event]
+        if np.all(times[1:] >= times[:-1]):
+            return np.arange(np.searchsorted(times,t0,side='left'), np.searchsorted(times,t1,side='left'), dtype=np.int64)
+        order = np.argsort(times, kind='stable')
+        sortedTimes = times[order]
+        return np.sort(order[np.searchsorted(sortedTimes,t0,side='left'):np.searchsorted(sortedTimes,t1,side='left')])
+
     def GetWavelengths(self,*,rois:list=[]):
         if len(self.wavelength) == 0:
             return []
@@ -300,45 +1280,474 @@ class SpeReference():
         Work in progress
         Current keys: exposure, analog_gain, adc_speed, sensor_temperature
         '''
+        summary = self.GetSettingsSummary()
         settings_dictionary = {
-            'exposure': None,
-            'analog_gain': None,
-            'adc_speed': None,
-            'sensor_temperature': None
+            'exposure': None if summary['exposure'] is None else np.float64(summary['exposure']),
+            'analog_gain': None if summary['analog_gain'] is None else str(summary['analog_gain']),
+            'adc_speed': None if summary['adc_speed'] is None else np.float64(summary['adc_speed']),
+            'sensor_temperature': None if summary['sensor_temperature'] is None else np.float64(summary['sensor_temperature'])
         }
-        xmlRoot = ET.fromstring(self.xmlFooter)
-        for child in xmlRoot:
-            if 'DataHistories'.casefold() in child.tag.casefold():
-                for child1 in child:
-                    if 'DataHistory'.casefold() in child1.tag.casefold():
-                        for child2 in child1:
-                            if 'Origin'.casefold() in child2.tag.casefold():
-                                for child3 in child2:
-                                    if 'Experiment'.casefold() in child3.tag.casefold():
-                                        for child4 in child3:                                            
-                                            if 'Devices'.casefold() in child4.tag.casefold():
-                                                for child2 in child4:
-                                                    if 'Cameras'.casefold() in child2.tag.casefold():
-                                                        for child3 in child2:
-                                                            if 'Camera'.casefold() in child3.tag.casefold():
-                                                                for child4 in child3:
-                                                                    if 'ShutterTiming'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'ExposureTime'.casefold() in child5.tag.casefold():
-                                                                                settings_dictionary['exposure'] = np.float64(child5.text)
-                                                                    if 'Adc'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Speed'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    settings_dictionary['adc_speed']=np.float64(child5.text)
-                                                                            if 'AnalogGain'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    settings_dictionary['analog_gain']=child5.text
-                                                                    if 'Sensor'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Temperature'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'Reading'.casefold() in child6.tag.casefold():
-                                                                                        settings_dictionary['sensor_temperature']=np.float64(child6.text)
         return settings_dictionary
-    
\ No newline at end of file
+
+    #all settings from speXml.GetSettingsSummary, computed once (or restored from a header cache)
+    def GetSettingsSummary(self) -> dict:
+        if self._settings is None:
+            self._settings = GetSettingsSummary(self.xmlIndex)
+        return dict(self._settings)
+
+#persistent store of parsed SpeReference headers, so re-opening large collections skips reading and parsing footers
+#entries are keyed by absolute path and only used while the file's size and mtime are unchanged
+#usage: cache = SpeHeaderCache('headers.cache'); spe = SpeReference(file, headerCache=cache); ...; cache.Save()
+#stored with pickle, only load cache files you created
+class SpeHeaderCache:
+    version = 2
+    def __init__(self, cachePath: str=None):
+        self.cachePath = cachePath
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        if cachePath is not None and os.path.exists(cachePath):
+            with open(cachePath,'rb') as f:
+                stored = pickle.load(f)
+            if stored.get('version') == self.version:
+                self._entries = stored['entries']
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _Key(filePath):
+        stat = os.stat(filePath)
+        return os.path.abspath(filePath), (stat.st_size, stat.st_mtime_ns)
+
+    #header state for the file, or None if it is not cached or the file changed since
+    def Get(self, filePath):
+        path, signature = self._Key(filePath)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != signature:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(entry[1])
+
+    def Put(self, filePath, state):
+        path, signature = self._Key(filePath)
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[path] = (signature, blob)
+
+    #drops one file, or everything if no file is given
+    def Invalidate(self, filePath: str=None):
+        with self._lock:
+            if filePath is None:
+                self._entries = {}
+            else:
+                self._entries.pop(os.path.abspath(filePath), None)
+
+    #writes the cache file, replacing the old one only once the new one is complete
+    def Save(self):
+        if self.cachePath is None:
+            raise ValueError('No cache path set')
+        with self._lock:
+            entries = dict(self._entries)
+        tmpPath = self.cachePath + '.tmp'
+        with open(tmpPath,'wb') as f:
+            pickle.dump({'version':self.version, 'entries':entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, self.cachePath)
+
+#decoded frames shared between SpeReferences (and threads), least recently used frames are dropped once maxBytes is exceeded
+#keyed by file path + size + mtime, roi and frame, so a rewritten file never serves stale data
+#usage: cache = SpeFrameCache(512<<20, admitBytes=64<<20); spe = SpeReference(file, frameCache=cache); cache.hits, cache.misses, cache.evictions
+class SpeFrameCache:
+    def __init__(self, maxBytes: int=256<<20, *, admitBytes: int=None):
+        if maxBytes < 0:
+            raise ValueError('maxBytes must not be negative')
+        self.maxBytes = maxBytes
+        #largest read whose frames are stored, bigger (streaming) reads are served from the cache but don't flush it
+        self.admitBytes = maxBytes//4 if admitBytes is None else admitBytes
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    #identity of the file contents, looked up on every read
+    @staticmethod
+    def FileKey(filePath):
+        stat = os.stat(filePath)
+        return (os.path.abspath(filePath), stat.st_size, stat.st_mtime_ns)
+
+    def Get(self, fileKey, roi, frame):
+        with self._lock:
+            data = self._entries.get((fileKey, roi, frame))
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((fileKey, roi, frame))
+            self.hits += 1
+            return data
+
+    #batch lookup of (roi, frame) keys under one lock acquisition, None for the ones not cached
+    def GetMany(self, fileKey, keys):
+        found = []
+        with self._lock:
+            for roi, frame in keys:
+                data = self._entries.get((fileKey, roi, frame))
+                if data is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end((fileKey, roi, frame))
+                    self.hits += 1
+                found.append(data)
+        return found
+
+    #stores a read-only copy, frames larger than the whole budget are not cached
+    def Put(self, fileKey, roi, frame, data):
+        self.PutMany(fileKey, [((roi, frame), data)])
+
+    #batch store of ((roi, frame), data) items under one lock acquisition
+    def PutMany(self, fileKey, items):
+        copies = []
+        for key, data in items:
+            if data.nbytes > self.maxBytes:
+                continue
+            data = np.array(data)
+            data.flags.writeable = False
+            copies.append(((fileKey,)+tuple(key), data))
+        with self._lock:
+            for key, data in copies:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.currentBytes -= old.nbytes
+                self._entries[key] = data
+                self.currentBytes += data.nbytes
+            while self.currentBytes > self.maxBytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.currentBytes -= evicted.nbytes
+                self.evictions += 1
+
+    #drops every frame of one file, or everything if no file is given
+    def Invalidate(self, filePath: str=None):
+        with self._lock:
+            if filePath is None:
+                self._entries = OrderedDict()
+                self.currentBytes = 0
+                return
+            path = os.path.abspath(filePath)
+            for key in [key for key in self._entries if key[0][0] == path]:
+                self.currentBytes -= self._entries.pop(key).nbytes
+
+#one global frame index across many spe files, e.g. the files of a LightField sequence
+#headers are read the first time the dataset is indexed, frames are only read when requested
+#usage: ds = SpeDataset('C:/data/run*.spe'); len(ds); ds[10] (list of roi frames); ds.GetData(rois=[0], frames=range(100,200))
+class SpeDataset:
+    def __init__(self, paths, *, maxOpen: int=16, headerCache=None, frameCache=None):
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(paths))
+        self.paths = list(paths)
+        if len(self.paths) == 0:
+            raise ValueError('No spe files given')
+        if maxOpen < 1:
+            raise ValueError('maxOpen must be at least 1')
+        self.maxOpen = maxOpen
+        self.headerCache = headerCache
+        self.frameCache = frameCache
+        self.roiList = []
+        self.dataType = None
+        self._frameStarts = None
+        #one reference per file, so each header is parsed once; _open holds the indices with a file handle, least recently used first
+        self._references = [None]*len(self.paths)
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    #references are kept for good, only the file handles of the least recently used ones are closed once more than
+    #maxOpen files are in use (SpeReference reopens its handle on the next read)
+    def _Reference(self, fileIndex: int):
+        with self._lock:
+            reference = self._references[fileIndex]
+        if reference is None:
+            reference = SpeReference(self.paths[fileIndex], headerCache=self.headerCache, frameCache=self.frameCache)
+        with self._lock:
+            if self._references[fileIndex] is None:
+                self._references[fileIndex] = reference
+            reference = self._references[fileIndex]
+            self._open[fileIndex] = True
+            self._open.move_to_end(fileIndex)
+            while len(self._open) > self.maxOpen:
+                self._references[self._open.popitem(last=False)[0]].Close()
+        return reference
+
+    def Close(self):
+        with self._lock:
+            for fileIndex in self._open:
+                self._references[fileIndex].Close()
+            self._open = OrderedDict()
+
+    #reads every header once, checks the region layouts agree and builds the global frame offsets
+    def _Scan(self):
+        if self._frameStarts is not None:
+            return
+        counts = []
+        layout = None
+        for i in range(0,len(self.paths)):
+            reference = self._Reference(i)
+            fileLayout = (str(reference.dataType),) + tuple((int(roi.width),int(roi.height)) for roi in reference.roiList)
+            if layout is None:
+                layout = fileLayout
+                self.roiList = reference.roiList
+                self.dataType = reference.dataType
+            elif fileLayout != layout:
+                raise ValueError('Region layout of %s %s does not match %s %s'%(self.paths[i], fileLayout, self.paths[0], layout))
+            counts.append(int(reference.numFrames))
+        self._frameStarts = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    @property
+    def numFrames(self):
+        self._Scan()
+        return int(self._frameStarts[-1])
+
+    def __len__(self):
+        return self.numFrames
+
+    #file path and frame within that file for a global frame index
+    def Locate(self, frame: int):
+        self._Scan()
+        if frame < 0:
+            frame += self.numFrames
+        if frame < 0 or frame >= self.numFrames:
+            raise IndexError('Frame %d out of range for %d frames'%(frame, self.numFrames))
+        fileIndex = int(np.searchsorted(self._frameStarts, frame, side='right'))-1
+        return self.paths[fileIndex], frame-int(self._frameStarts[fileIndex])
+
+    def GetData(self,*,rois:list=[], frames:list=[], cached: bool=True):
+        self._Scan()
+        if len(rois) == 0:
+            rois = np.arange(0,len(self.roiList))
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        frames = np.asarray(frames,dtype=np.int64).ravel()
+        for item in rois:
+            if item < 0 or item >= len(self.roiList):
+                raise ValueError('ROI value outside of allowed ranged (%d through %d)'%(0, len(self.roiList)-1))
+        if frames.size > 0 and (frames.min() < 0 or frames.max() >= self.numFrames):
+            raise ValueError('Frame value outside of allowed ranged (%d through %d)'%(0, self.numFrames-1))
+        dataList = [np.empty((len(frames),int(self.roiList[item].height),int(self.roiList[item].width)),dtype=self.dataType) for item in rois]
+        fileIndices = np.searchsorted(self._frameStarts, frames, side='right')-1
+        #one planned read per file touched, results go back to their positions in the request
+        for fileIndex in np.unique(fileIndices):
+            positions = np.flatnonzero(fileIndices == fileIndex)
+            localFrames = frames[positions]-self._frameStarts[fileIndex]
+            fileData = self._Reference(int(fileIndex))._ReadFrames(rois, localFrames, cached=cached)
+            for k in range(0,len(rois)):
+                dataList[k][positions] = fileData[k]
+        return dataList
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            frame = int(key) + self.numFrames if key < 0 else int(key)
+            if frame < 0 or frame >= self.numFrames:
+                raise IndexError('Frame %d out of range for %d frames'%(int(key), self.numFrames))
+            return [data[0] for data in self.GetData(frames=[frame])]
+        if isinstance(key, slice):
+            return self.GetData(frames=np.arange(*key.indices(self.numFrames)))
+        return self.GetData(frames=key)
+
+    def __iter__(self):
+        for frames, dataList in self.IterFrames():
+            for j in range(0,len(frames)):
+                yield [data[j] for data in dataList]
+
+    #same as SpeReference.IterFrames, over the global frame index
+    def IterFrames(self,*,rois:list=[], frames:list=[], chunkFrames: int=64):
+        self._Scan()
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        if chunkFrames < 1:
+            raise ValueError('chunkFrames must be at least 1')
+        frames = np.asarray(frames,dtype=np.int64)
+        for start in range(0,len(frames),chunkFrames):
+            batch = frames[start:start+chunkFrames]
+            yield batch, self.GetData(rois=rois, frames=batch, cached=False)
+
+#streaming spe 3.0 writer, output reads back through SpeReference / readSpe / LightField
+#usage:
+#   with SpeWriter(path, rois=[(width, height)], pixelFormat='MonochromeUnsigned16') as writer:
+#       writer.WriteFrames([frames])    (one array per roi, (frames, height, width) or a single (height, width) frame)
+#- rois can also be ROI objects, whose X/Y/xbin/ybin go into the SensorMapping calibration
+#- metaList takes MetaContainer entries (e.g. MetaContainer('TimeStamp',8,metaEvent='ExposureStarted',metaResolution=1000000,metaDataType='Int64'))
+#  and WriteFrames then needs metadata=(frames, bytes per readout) uint8 or a matching structured array
+#- frames go out in large buffered writes, the xml footer (DataFormat/MetaFormat/Calibrations) is written on Close
+class SpeWriter:
+    namespace = 'http://www.princetoninstruments.com/spe/2009'
+    def __init__(self, filePath: str, rois: list, *, pixelFormat: str='MonochromeUnsigned16', metaList: list=[], wavelength=None,
+                 sensorDims=None, extraXml: str='', bufferSize: int=16 << 20):
+        if pixelFormat not in SpeReference.dataTypes:
+            raise ValueError('pixelFormat must be one of %s'%(', '.join(SpeReference.dataTypes)))
+        if len(rois) == 0:
+            raise ValueError('At least one ROI is needed')
+        self.filePath = filePath
+        self.pixelFormat = pixelFormat
+        self.dataType = np.dtype(SpeReference.dataTypes[pixelFormat])
+        bpp = self.dataType.itemsize
+        self.roiList = []
+        for item in rois:
+            #own copies, the caller's ROI objects (e.g. the roiList of an open SpeReference) are left untouched
+            if isinstance(item, ROI):
+                roi = ROI(int(item.width),int(item.height),0)
+                roi.X, roi.Y, roi.xbin, roi.ybin = int(item.X), int(item.Y), int(item.xbin), int(item.ybin)
+            else:
+                roi = ROI(int(item[0]),int(item[1]),0)
+            roi.stride = int(roi.width)*int(roi.height)*bpp
+            self.roiList.append(roi)
+        self.metaList = list(metaList)
+        self.dataSize = sum(int(roi.stride) for roi in self.roiList)
+        self.metaSize = sum(int(meta.stride) for meta in self.metaList)
+        self.readoutStride = self.dataSize + self.metaSize
+        self.wavelength = wavelength
+        self.sensorDims = sensorDims
+        self.extraXml = extraXml
+        self.numFrames = 0
+        self._file = open(filePath, 'wb', buffering=bufferSize)
+        #xml location stays 0 until Close, which is how an unfinished file can be recognized
+        self._file.write(self._Header(0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    def _Header(self, xmlLoc: int):
+        header = bytearray(4100)
+        first = self.roiList[0]
+        legacyTypes = {'MonochromeUnsigned16':3, 'MonochromeUnsigned32':8, 'MonochromeFloating32':0}
+        np.frombuffer(header, dtype=np.uint16, count=1, offset=42)[0] = min(int(first.width), 65535)
+        np.frombuffer(header, dtype=np.int16, count=1, offset=108)[0] = legacyTypes[self.pixelFormat]
+        np.frombuffer(header, dtype=np.uint16, count=1, offset=656)[0] = min(int(first.height), 65535)
+        np.frombuffer(header, dtype=np.uint64, count=1, offset=678)[0] = xmlLoc
+        np.frombuffer(header, dtype=np.int32, count=1, offset=1446)[0] = min(self.numFrames, 2**31-1)
+        np.frombuffer(header, dtype=np.float32, count=1, offset=1992)[0] = 3.0
+        np.frombuffer(header, dtype=np.int16, count=1, offset=4098)[0] = 0x5555
+        return bytes(header)
+
+    #appends frames for every roi, plus metadata bytes if the writer has a metaList
+    def WriteFrames(self, dataList: list, *, metadata=None):
+        if self._file is None:
+            raise ValueError('Writer is closed')
+        if len(dataList) != len(self.roiList):
+            raise ValueError('Expected data for %d ROIs, got %d'%(len(self.roiList), len(dataList)))
+        arrays = []
+        for roi, data in zip(self.roiList, dataList):
+            data = np.asarray(data, dtype=self.dataType)
+            if data.ndim == 2:
+                data = data[None,:,:]
+            if data.shape[1:] != (int(roi.height), int(roi.width)):
+                raise ValueError('ROI data shape %s does not match (frames, %d, %d)'%(data.shape, int(roi.height), int(roi.width)))
+            arrays.append(data)
+        count = arrays[0].shape[0]
+        if any(data.shape[0] != count for data in arrays):
+            raise ValueError('All ROIs need the same number of frames')
+        if self.metaSize > 0:
+            if metadata is None:
+                raise ValueError('Writer has a metaList, metadata is required')
+            metadata = np.ascontiguousarray(metadata)
+            metadata = metadata.view(np.uint8).reshape(count, -1) if metadata.dtype.names else np.asarray(metadata, dtype=np.uint8).reshape(count, -1)
+            if metadata.shape[1] != self.metaSize:
+                raise ValueError('Metadata needs %d bytes per frame'%(self.metaSize))
+        elif metadata is not None:
+            raise ValueError('Writer has no metaList, metadata not expected')
+        if count == 0:
+            return
+        if len(arrays) == 1 and self.metaSize == 0:
+            #readouts are just the frames back to back, write straight from the caller's array
+            self._file.write(memoryview(np.ascontiguousarray(arrays[0])).cast('B'))
+        else:
+            block = np.empty((count, self.readoutStride), dtype=np.uint8)
+            offset = 0
+            for data in arrays:
+                size = data.shape[1]*data.shape[2]*self.dataType.itemsize
+                block[:, offset:offset+size] = np.ascontiguousarray(data).view(np.uint8).reshape(count, size)
+                offset += size
+            if self.metaSize > 0:
+                block[:, offset:] = metadata
+            self._file.write(memoryview(block).cast('B'))
+        self.numFrames += count
+
+    def _Footer(self):
+        bpp = self.dataType.itemsize
+        #calibration ids: wavelength mapping and sensor information are shared, every region gets its own sensor mapping
+        nextId = 1
+        wavelengthId = sensorId = None
+        if self.wavelength is not None and len(self.wavelength) > 0:
+            wavelengthId = nextId
+            nextId += 1
+        if self.sensorDims is not None:
+            sensorId = nextId
+            nextId += 1
+        mappingIds = list(range(nextId, nextId+len(self.roiList)))
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<SpeFormat version="3.0" xmlns=%s>'%(quoteattr(self.namespace)),
+                 '<DataFormat>',
+                 '<DataBlock type="Frame" count="%d" pixelFormat="%s" size="%d" stride="%d">'%(self.numFrames, self.pixelFormat, self.dataSize, self.readoutStride)]
+        for roi, mappingId in zip(self.roiList, mappingIds):
+            calibrations = ','.join(str(item) for item in (wavelengthId, sensorId, mappingId) if item is not None)
+            lines.append('<DataBlock type="Region" count="1" width="%d" height="%d" size="%d" stride="%d" calibrations="%s" />'
+                         %(int(roi.width), int(roi.height), int(roi.width)*int(roi.height)*bpp, int(roi.stride), calibrations))
+        lines.append('</DataBlock>')
+        lines.append('</DataFormat>')
+        if len(self.metaList) > 0:
+            lines.append('<MetaFormat>')
+            lines.append('<MetaBlock type="Frame" count="%d">'%(self.numFrames))
+            for meta in self.metaList:
+                attributes = ''
+                if meta.metaEvent:
+                    attributes += ' event=%s'%(quoteattr(meta.metaEvent))
+                if meta.metaComponent:
+                    attributes += ' component=%s'%(quoteattr(meta.metaComponent))
+                if meta.metaDataType:
+                    attributes += ' type=%s'%(quoteattr(meta.metaDataType))
+                attributes += ' bitDepth="%d"'%(int(meta.stride)*8)
+                if meta.metaResolution:
+                    attributes += ' resolution="%d"'%(int(meta.metaResolution))
+                lines.append('<%s%s />'%(meta.metaType, attributes))
+            lines.append('</MetaBlock>')
+            lines.append('</MetaFormat>')
+        lines.append('<Calibrations>')
+        if self.wavelength is not None and len(self.wavelength) > 0:
+            lines.append('<WavelengthMapping id="%d">'%(wavelengthId))
+            lines.append('<Wavelength xml:space="preserve">%s</Wavelength>'%(','.join(repr(float(item)) for item in self.wavelength)))
+            lines.append('</WavelengthMapping>')
+        if self.sensorDims is not None:
+            lines.append('<SensorInformation id="%d" width="%d" height="%d" />'%(sensorId, int(self.sensorDims.width), int(self.sensorDims.height)))
+        for roi, mappingId in zip(self.roiList, mappingIds):
+            lines.append('<SensorMapping id="%d" x="%d" y="%d" width="%d" height="%d" xBinning="%d" yBinning="%d" />'
+                         %(mappingId, int(roi.X), int(roi.Y), int(roi.width)*int(roi.xbin), int(roi.height)*int(roi.ybin), int(roi.xbin), int(roi.ybin)))
+        lines.append('</Calibrations>')
+        if self.extraXml:
+            lines.append(self.extraXml)
+        lines.append('</SpeFormat>')
+        return '\n'.join(lines)
+
+    #writes the footer and fills in the header fields that depend on it
+    def Close(self):
+        if self._file is None:
+            return
+        try:
+            xmlLoc = self._file.tell()
+            self._file.write(self._Footer().encode('utf8'))
+            self._file.seek(0)
+            self._file.write(self._Header(xmlLoc))
+        finally:
+            self._file.close()
+            self._file = None
@@ -6,6 +6,7 @@ Created on Wed Feb  9 16:03:10 2022
 """
 
 from readSpe import readSpe
+from speXml import IndexFooter, GetSettingsSummary
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
@@ -178,26 +179,18 @@ def ParseXmlForRegion(xmlStr, region):
     startX = -1
     width = -1
     if len(xmlStr)>50:
-        xmlRoot = ET.fromstring(xmlStr)
-        #find DataHistories
-        for child in xmlRoot:
-            if 'Calibrations'.casefold() in child.tag.casefold():
-                counter = 0
-                for child1 in child:                    
-                    if 'SensorMapping'.casefold() in child1.tag.casefold():
-                        if counter == region:
-                            startX = np.int32(child1.get('x'))
-                            startY = np.int32(child1.get('y'))
-                            ogWidth = np.int32(child1.get('width'))
-                            ogHeight = np.int32(child1.get('height'))
-                            xbin = np.int32(child1.get('xBinning'))
-                            ybin = np.int32(child1.get('yBinning'))
-                            width = np.int32(ogWidth / xbin)
-                            height = np.int32(ogHeight / ybin)
-                            rgn.Set(startX, startY, ogWidth, ogHeight, width, height, xbin, ybin)
-                            break
-                        else:
-                            counter += 1
+        mappings = IndexFooter(xmlStr).GetAll('Calibrations/SensorMapping')
+        if region < len(mappings):
+            attrib = mappings[region].attrib
+            startX = np.int32(attrib.get('x'))
+            startY = np.int32(attrib.get('y'))
+            ogWidth = np.int32(attrib.get('width'))
+            ogHeight = np.int32(attrib.get('height'))
+            xbin = np.int32(attrib.get('xBinning'))
+            ybin = np.int32(attrib.get('yBinning'))
+            width = np.int32(ogWidth / xbin)
+            height = np.int32(ogHeight / ybin)
+            rgn.Set(startX, startY, ogWidth, ogHeight, width, height, xbin, ybin)
     return startX, width
        
 #gets data out of spe file
@@ -317,276 +310,83 @@ def FindXmlElems(xmlStr, stringList):
 def PrintSelectedXmlEntries(xmlStr):
     global bits, bg    
     if len(xmlStr)>50:
-        xmlRoot = ET.fromstring(xmlStr)
-        #find DataHistories
-        for child in xmlRoot:
-            if 'DataHistories'.casefold() in child.tag.casefold():
-                for child1 in child:
-                    if 'DataHistory'.casefold() in child1.tag.casefold():
-                        for child2 in child1:
-                            if 'Origin'.casefold() in child2.tag.casefold():
-                                print('LF version used:\t%s'%(child2.get('softwareVersion')))
-                                for child3 in child2:
-                                    if 'Experiment'.casefold() in child3.tag.casefold():
-                                        for child4 in child3:
-                                            if 'System'.casefold() in child4.tag.casefold():
-                                                for child2 in child4:
-                                                    if 'Cameras'.casefold() in child2.tag.casefold():
-                                                        for child3 in child2:
-                                                            if 'Camera'.casefold() in child3.tag.casefold():
-                                                                print('Camera model: %s\n\tSN: %s'%(child3.get('model'),child3.get('serialNumber')))
-                                                    if 'Spectrometers'.casefold() in child2.tag.casefold():
-                                                        for child3 in child2:
-                                                            if 'Spectrometer'.casefold() in child3.tag.casefold():
-                                                                print('Spectrograph model: %s\n\tSN: %s'%(child3.get('model'),child3.get('serialNumber')))                                            
-                                            if 'Devices'.casefold() in child4.tag.casefold():
-                                                for child2 in child4:
-                                                    if 'Cameras'.casefold() in child2.tag.casefold():
-                                                        for child3 in child2:
-                                                            if 'Camera'.casefold() in child3.tag.casefold():
-                                                                for child4 in child3:
-                                                                    if 'Sensor'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Information'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'SensorName'.casefold() in child6.tag.casefold():
-                                                                                        print('Camera sensor:\t\t%s'%(child6.text))
-                                                                                    if 'Pixel'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if ('Width'.casefold() in child7.tag.casefold()) and ('GapWidth'.casefold() not in child7.tag.casefold()):
-                                                                                                print('Pixel width:\t\t%sum'%(child7.text))
-                                                                            if 'Temperature'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'Reading'.casefold() in child6.tag.casefold():
-                                                                                        print('Temperature:\t\t%sC, Status: '%(child6.text),end='')
-                                                                                    if ('Status'.casefold() in child6.tag.casefold()) and ('CoolingFanStatus'.casefold() not in child6.tag.casefold()) and ('VacuumStatus'.casefold() not in child6.tag.casefold()):
-                                                                                        print('%s'%(child6.text))
-                                                                                    if ('VacuumStatus'.casefold() in child6.tag.casefold()):
-                                                                                        print('Vacuum Status:\t\t%s'%(child6.text))
-                                                                            if 'Cleaning'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'CleanSerialRegister'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            print('Clean Serial Reg:\t%s'%(child6.text))
-                                                                                    if 'CleanUntilTrigger'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            print('Clean Until Trig:\t%s'%(child6.text))
-                                                                    if 'ShutterTiming'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'ExposureTime'.casefold() in child5.tag.casefold():
-                                                                                print('Exposure Time:\t\t%s ms'%(child5.text))
-                                                                            if 'Mode'.casefold() in child5.tag.casefold():
-                                                                                print('Shutter Mode:\t\t%s'%(child5.text))
-                                                                    if 'Gating'.casefold() in child4.tag.casefold():
-                                                                        gateMode = ''
-                                                                        startDelay = 0
-                                                                        endDelay = 0
-                                                                        startWidth = 0
-                                                                        endWidth = 0
-                                                                        for child5 in child4:
-                                                                            if 'Mode'.casefold() in child5.tag.casefold():
-                                                                                gateMode = child5.text
-                                                                            if 'RepetitiveGate'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    for child6 in child5:
-                                                                                        if 'Pulse'.casefold() in child6.tag.casefold():
-                                                                                            startWidth = np.float64(child6.get('width'))
-                                                                                            startDelay = np.float64(child6.get('delay'))
-                                                                            if 'Sequential'.casefold() in child5.tag.casefold():                                                                                
-                                                                                for child6 in child5:
-                                                                                    if 'StartingGate'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            for child7 in child6:
-                                                                                                if 'Pulse'.casefold() in child7.tag.casefold():
-                                                                                                    startWidth = np.float64(child7.get('width'))
-                                                                                                    startDelay = np.float64(child7.get('delay'))
-                                                                                    if 'EndingGate'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            for child7 in child6:
-                                                                                                if 'Pulse'.casefold() in child7.tag.casefold():
-                                                                                                    endWidth = np.float64(child7.get('width'))
-                                                                                                    endDelay = np.float64(child7.get('delay'))  
-                                                                            if 'Dif'.casefold() in child5.tag.casefold():                                                                                
-                                                                                for child6 in child5:
-                                                                                    if 'StartingGate'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            for child7 in child6:
-                                                                                                if 'Pulse'.casefold() in child7.tag.casefold():
-                                                                                                    startWidth = np.float64(child7.get('width'))
-                                                                                                    startDelay = np.float64(child7.get('delay'))
-                                                                                    if 'EndingGate'.casefold() in child6.tag.casefold():
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            for child7 in child6:
-                                                                                                if 'Pulse'.casefold() in child7.tag.casefold():
-                                                                                                    endWidth = np.float64(child7.get('width'))
-                                                                                                    endDelay = np.float64(child7.get('delay'))
-                                                                                                    gateMode = 'Dif'
-                                                                        if gateMode == 'Repetitive':
-                                                                            print('Gating:\t\t\t\t%s\nGate Width:\t\t\t%0.3f ns\nGate Delay:\t\t\t%0.3f ns'%(gateMode,startWidth,startDelay))
-                                                                        if gateMode == 'Sequential' or gateMode == 'Dif':
-                                                                            print('Gating:\t\t\t\t%s\nStart Width:\t\t%0.3f ns\nStart Delay:\t\t%0.3f ns\nEnd Width:\t\t\t%0.3f ns\nEnd Delay:\t\t\t%0.3f ns'
-                                                                                  %(gateMode,startWidth,startDelay,endWidth,endDelay))
-                                                                    if 'Intensifier'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Gain'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('Intensifier Gain:\t%sx'%(child5.text))
-                                                                            if 'Status'.casefold() in child5.tag.casefold():
-                                                                                print('Intensifier Status:\t%s'%(child5.text))
-                                                                            if 'EMIccd'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if ('Gain'.casefold() in child6.tag.casefold()) and ('GainControlMode'.casefold() not in child6.tag.casefold()):
-                                                                                        if child6.get('relevance') != 'False':
-                                                                                            print('EMI Gain:\t\t\t%sx'%(child6.text))
-                                                                                
-                                                                    if 'ReadoutControl'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Mode'.casefold() in child5.tag.casefold():
-                                                                                print('Readout Mode:\t\t%s'%(child5.text))
-                                                                            if 'Time'.casefold() in child5.tag.casefold():
-                                                                                print('Readout Time:\t\t%0.3f ms'%(np.float32(child5.text)))
-                                                                            if 'StorageShiftRate'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('Storage Shift:\t\t%sus'%(child5.text))
-                                                                            if 'VerticalShiftRate'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('Vertical Shift:\t\t%sus'%(child5.text))
-                                                                            if 'PortsUsed'.casefold() in child5.tag.casefold():
-                                                                                print('Ports Used:\t\t\t%s'%(child5.text))
-                                                                            if 'Accumulations'.casefold() in child5.tag.casefold():
-                                                                                print('Accumulations:\t\t%s'%(child5.text))
-                                                                    if 'HardwareIO'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:                                                    
-                                                                            if 'Trigger'.casefold() in child5.tag.casefold():
-                                                                                triggerMode = ''
-                                                                                triggerFreq = 0
-                                                                                for child6 in child5:
-                                                                                    if 'Frequency'.casefold() in child6.tag.casefold():
-                                                                                        triggerFreq = np.float64(child6.text)
-                                                                                    if 'Source'.casefold() in child6.tag.casefold():
-                                                                                        triggerMode = child6.text
-                                                                                if triggerMode == "Internal":
-                                                                                    print('Trigger:\t\t\tInternal, %0.3f Hz'%(triggerFreq))
-                                                                    if 'Adc'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Speed'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('ADC Speed:\t\t\t%s MHz'%(child5.text))
-                                                                            if 'AnalogGain'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('Analog Gain:\t\t%s'%(child5.text))
-                                                                            if 'EMGain'.casefold() in child5.tag.casefold():
-                                                                                if child5.get('relevance') != 'False':
-                                                                                    print('EM Gain:\t\t\t%sx'%(child5.text))
-                                                                            if 'Quality'.casefold() in child5.tag.casefold():
-                                                                                print('ADC Quality:\t\t%s'%(child5.text))
-                                                                            if 'CorrectPixelBias'.casefold() in child5.tag.casefold():
-                                                                                print('PBC On?:\t\t\t%s'%(child5.text))
-                                                                            if 'BitDepth'.casefold() in child5.tag.casefold():
-                                                                                bits = np.int32(child5.text)
-                                                                    if 'Acquisition'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'FrameRate'.casefold() in child5.tag.casefold():
-                                                                                print('Frame Rate:\t\t\t%0.3f fps'%(np.float32(child5.text)))
-                                                                    if 'Experiment'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'OnlineProcessing'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'FrameCombination'.casefold() in child6.tag.casefold():
-                                                                                        isCombined = True
-                                                                                        method = ''
-                                                                                        framesCombined = 1
-                                                                                        for child7 in child6:
-                                                                                            if 'Method'.casefold() in child7.tag.casefold():
-                                                                                                if child7.get('relevance') == 'False': #if relevance is there, that means it's false
-                                                                                                    isCombined = False
-                                                                                                method = child7.text
-                                                                                            if 'FramesCombined'.casefold() in child7.tag.casefold():
-                                                                                                framesCombined = np.int64(child7.text)
-                                                                                        if isCombined:
-                                                                                            print('Frame Combination:\t%s of %d frames.'%(method,framesCombined))
-                                                                            if 'OnlineCorrections'.casefold() in child5.tag.casefold():
-                                                                                correctionList = []
-                                                                                for child6 in child5:
-                                                                                    if 'OrientationCorrection'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if 'Enabled'.casefold() in child7.tag.casefold():
-                                                                                                if child7.text == 'True':
-                                                                                                    correctionList.append('Orientation')
-                                                                                    if 'BlemishCorrection'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if 'Enabled'.casefold() in child7.tag.casefold():
-                                                                                                if child7.text == 'True':
-                                                                                                    correctionList.append('Blemish')
-                                                                                    if 'BackgroundCorrection'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if 'Enabled'.casefold() in child7.tag.casefold():
-                                                                                                if child7.text == 'True':
-                                                                                                    correctionList.append('Background')
-                                                                                                    bg = True
-                                                                                    if 'FlatfieldCorrection'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if 'Enabled'.casefold() in child7.tag.casefold():
-                                                                                                if child7.text == 'True':
-                                                                                                    correctionList.append('Flatfield')
-                                                                                    if 'CosmicRayCorrection'.casefold() in child6.tag.casefold():
-                                                                                        for child7 in child6:
-                                                                                            if 'Enabled'.casefold() in child7.tag.casefold():
-                                                                                                if child7.text == 'True':
-                                                                                                    correctionList.append('Cosmic')
-                                                                                if len(correctionList) > 0:
-                                                                                    print('Correction(s):\t\t',end='')
-                                                                                    for i in range(0,len(correctionList)):
-                                                                                        print('%s'%(correctionList[i]),end='')
-                                                                                        if i <len(correctionList)-1:
-                                                                                            print(', ',end='')
-                                                                                    print('')
-                                                    if 'Spectrometers'.casefold() in child2.tag.casefold():                                
-                                                        for child3 in child2:
-                                                            if 'Spectrometer'.casefold() in child3.tag.casefold():
-                                                                for child4 in child3:
-                                                                    if 'Grating'.casefold() in child4.tag.casefold():
-                                                                        for child5 in child4:
-                                                                            if 'Selected'.casefold() in child5.tag.casefold():
-                                                                                print('Grating:\t\t\t%s'%(child5.text),end='')
-                                                                            if 'CenterWavelength'.casefold() in child5.tag.casefold():
-                                                                                print(', CWL: %0.3f nm'%(np.float64(child5.text)))
-                                                                    if 'Experiment'.casefold() in child4.tag.casefold():
-                                                                        calibrationList = []
-                                                                        for child5 in child4:
-                                                                            if 'StepAndGlue'.casefold() in child5.tag.casefold():
-                                                                                startWL = 0
-                                                                                endWL = 0
-                                                                                enabled = ''
-                                                                                for child6 in child5:
-                                                                                    if 'Enabled'.casefold() in child6.tag.casefold():
-                                                                                        enabled = child6.text
-                                                                                    if 'StartingWavelength'.casefold() in child6.tag.casefold():
-                                                                                        startWL = np.float64(child6.text)
-                                                                                    if 'EndingWavelength'.casefold() in child6.tag.casefold():
-                                                                                        endWL = np.float64(child6.text)
-                                                                                if enabled == 'True':
-                                                                                    print('Step and Glue:\t\t%0.3f nm to %0.3f nm'%(startWL,endWL))
-                                                                            if 'IntensityCalibration'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'Enabled'.casefold() in child6.tag.casefold():
-                                                                                        if child6.text == 'True':
-                                                                                            calibrationList.append('Intensity')
-                                                                            if 'WavelengthCalibration'.casefold() in child5.tag.casefold():
-                                                                                for child6 in child5:
-                                                                                    if 'Mode'.casefold() in child6.tag.casefold():
-                                                                                        calType = child6.get('type')
-                                                                                        if calType == 'NullableCalibrationMode':
-                                                                                            break
-                                                                                        else:
-                                                                                            calString = 'Wavelength (%s)'%(child6.text)
-                                                                                            calibrationList.append(calString)                                                                                            
-                                                                        if len(calibrationList) > 0:
-                                                                            print('Calibration(s):\t\t',end='')
-                                                                            for i in range(0,len(calibrationList)):
-                                                                                print('%s'%(calibrationList[i]),end='')
-                                                                                if i <len(calibrationList)-1:
-                                                                                    print(', ',end='')        
+        summary = GetSettingsSummary(IndexFooter(xmlStr))
+        print('LF version used:\t%s'%(summary['lf_version']))
+        if summary['camera_model'] is not None:
+            print('Camera model: %s\n\tSN: %s'%(summary['camera_model'],summary['camera_serial']))
+        if summary['spectrometer_model'] is not None:
+            print('Spectrograph model: %s\n\tSN: %s'%(summary['spectrometer_model'],summary['spectrometer_serial']))
+        if summary['sensor_name'] is not None:
+            print('Camera sensor:\t\t%s'%(summary['sensor_name']))
+        if summary['pixel_width'] is not None:
+            print('Pixel width:\t\t%sum'%(summary['pixel_width']))
+        if summary['sensor_temperature'] is not None:
+            print('Temperature:\t\t%sC, Status: %s'%(summary['sensor_temperature'],summary['temperature_status']))
+        if summary['vacuum_status'] is not None:
+            print('Vacuum Status:\t\t%s'%(summary['vacuum_status']))
+        if summary['clean_serial_register'] is not None:
+            print('Clean Serial Reg:\t%s'%(summary['clean_serial_register']))
+        if summary['clean_until_trigger'] is not None:
+            print('Clean Until Trig:\t%s'%(summary['clean_until_trigger']))
+        if summary['exposure'] is not None:
+            print('Exposure Time:\t\t%s ms'%(summary['exposure']))
+        if summary['shutter_mode'] is not None:
+            print('Shutter Mode:\t\t%s'%(summary['shutter_mode']))
+        gateMode = summary['gate_mode']
+        if gateMode == 'Repetitive':
+            print('Gating:\t\t\t\t%s\nGate Width:\t\t\t%0.3f ns\nGate Delay:\t\t\t%0.3f ns'%(gateMode,summary['gate_start_width'] or 0,summary['gate_start_delay'] or 0))
+        if gateMode == 'Sequential' or gateMode == 'Dif':
+            print('Gating:\t\t\t\t%s\nStart Width:\t\t%0.3f ns\nStart Delay:\t\t%0.3f ns\nEnd Width:\t\t\t%0.3f ns\nEnd Delay:\t\t\t%0.3f ns'
+                  %(gateMode,summary['gate_start_width'] or 0,summary['gate_start_delay'] or 0,summary['gate_end_width'] or 0,summary['gate_end_delay'] or 0))
+        if summary['intensifier_gain'] is not None:
+            print('Intensifier Gain:\t%sx'%(summary['intensifier_gain']))
+        if summary['intensifier_status'] is not None:
+            print('Intensifier Status:\t%s'%(summary['intensifier_status']))
+        if summary['emi_gain'] is not None:
+            print('EMI Gain:\t\t\t%sx'%(summary['emi_gain']))
+        if summary['readout_mode'] is not None:
+            print('Readout Mode:\t\t%s'%(summary['readout_mode']))
+        if summary['readout_time'] is not None:
+            print('Readout Time:\t\t%0.3f ms'%(summary['readout_time']))
+        if summary['storage_shift_rate'] is not None:
+            print('Storage Shift:\t\t%sus'%(summary['storage_shift_rate']))
+        if summary['vertical_shift_rate'] is not None:
+            print('Vertical Shift:\t\t%sus'%(summary['vertical_shift_rate']))
+        if summary['ports_used'] is not None:
+            print('Ports Used:\t\t\t%s'%(summary['ports_used']))
+        if summary['accumulations'] is not None:
+            print('Accumulations:\t\t%s'%(summary['accumulations']))
+        if summary['trigger_source'] == 'Internal':
+            print('Trigger:\t\t\tInternal, %0.3f Hz'%(summary['trigger_frequency'] or 0))
+        if summary['adc_speed'] is not None:
+            print('ADC Speed:\t\t\t%s MHz'%(summary['adc_speed']))
+        if summary['analog_gain'] is not None:
+            print('Analog Gain:\t\t%s'%(summary['analog_gain']))
+        if summary['em_gain'] is not None:
+            print('EM Gain:\t\t\t%sx'%(summary['em_gain']))
+        if summary['adc_quality'] is not None:
+            print('ADC Quality:\t\t%s'%(summary['adc_quality']))
+        if summary['pixel_bias_correction'] is not None:
+            print('PBC On?:\t\t\t%s'%(summary['pixel_bias_correction']))
+        if summary['bit_depth'] is not None:
+            bits = np.int32(summary['bit_depth'])
+        if summary['frame_rate'] is not None:
+            print('Frame Rate:\t\t\t%0.3f fps'%(summary['frame_rate']))
+        if summary['frame_combination'] is not None:
+            print('Frame Combination:\t%s of %d frames.'%(summary['frame_combination'],summary['frames_combined']))
+        if 'Background' in summary['corrections']:
+            bg = True
+        if len(summary['corrections']) > 0:
+            print('Correction(s):\t\t%s'%(', '.join(summary['corrections'])))
+        if summary['grating'] is not None:
+            print('Grating:\t\t\t%s'%(summary['grating']),end='')
+            if summary['center_wavelength'] is not None:
+                print(', CWL: %0.3f nm'%(summary['center_wavelength']),end='')
+            print('')
+        if summary['step_and_glue'] is not None:
+            print('Step and Glue:\t\t%0.3f nm to %0.3f nm'%summary['step_and_glue'])
+        if len(summary['calibrations']) > 0:
+            print('Calibration(s):\t\t%s'%(', '.join(summary['calibrations'])))
     print('')
     print('Viewing Region:\t\t%d x %d, xBin %d, yBin %d\n\tFull ROI Info: [%d, %d, %d, %d, %d, %d]'%(rgn.ogWidth_,rgn.ogHeight_,rgn.xBin_,rgn.yBin_,
                                                                                                            rgn.startX_,rgn.startY_,rgn.width_,rgn.height_,rgn.xBin_,rgn.yBin_))
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked, losslessly compressed archive of an spe file, with a reader that works like SpeReference
+
+usage:
+- from speArchive import Convert, SpeArchive, Extract
+- Convert('run1.spe', 'run1.spez', codec='zlib', workers=8) --> dict with sizes and ratio
+----- frames are stored in chunks of chunkFrames frames x tileRows rows per region, each piece (blob) delta filtered along rows
+----- (integer data) and byte shuffled, then compressed; chunks are compressed in parallel
+----- memory is set in bytes: blobBytes (default 4 MiB) is the uncompressed size chunkFrames / tileRows are derived from when not
+----- given (whole regions for small frames, row tiles of 512 rows for 4k x 4k uint16), bufferBytes bounds the chunks read ahead of the writer
+----- codecs: zlib, lzma (standard library), zstd / lz4 when the zstandard / lz4 packages are installed
+----- the spe header, per-frame metadata and the xml footer are kept byte for byte
+- spe = SpeArchive('run1.spez') has the SpeReference interface: GetData, IterFrames, Roi, Reduce, GetMetadata, GetWavelengths,
+  GetSettingsSummary... only the chunks a request touches are read and decompressed (memmap / GetView are not available);
+  decoded blobs are kept in an LRU of cacheBytes (default 256 MiB)
+- Extract('run1.spez', 'copy.spe') writes the original spe file back, identical to the input
+- command line: python speArchive.py C:/data/*.spe --codec lzma --workers 8 (writes .spez next to each file)
+
+layout: b'SPEZ' + format version (u32) | spe header (4100 bytes) | compressed chunks | xml footer as in the spe file |
+        json index | index offset (u64) | index length (u64) | b'SPEZ'
+"""
+
+import io
+import json
+import lzma
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from readSpe import SpeReference
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+magic = b'SPEZ'
+formatVersion = 1
+
+#name --> (compress(data, level), decompress(data)), level None uses the codec default
+codecs = {
+    'zlib': (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=6 if level is None else level), lzma.decompress),
+}
+if zstandard is not None:
+    codecs['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=3 if level is None else level).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data))
+if lz4 is not None:
+    codecs['lz4'] = (lambda data, level: lz4.frame.compress(data, compression_level=0 if level is None else level), lz4.frame.decompress)
+
+#delta along each row for integer data (wraps around in the pixel type, so it is exact), then the bytes of each pixel are grouped
+#by significance: the high bytes of dark frames are nearly constant and compress to almost nothing
+#one working copy of the band plus the shuffled bytes, the input (a view into the chunk that was read) is not modified
+def _Filter(data, delta):
+    if delta:
+        filtered = np.empty(data.shape, dtype=data.dtype)
+        filtered[...,0] = data[...,0]
+        np.subtract(data[...,1:], data[...,:-1], out=filtered[...,1:])
+        data = filtered
+    return np.ascontiguousarray(data).view(np.uint8).reshape(-1, data.dtype.itemsize).T.tobytes()
+
+def _Unfilter(raw, dtype, shape, delta):
+    data = np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+    if delta:
+        np.cumsum(data, axis=-1, dtype=dtype, out=data)
+    return data
+
+#filters and compresses the pixel arrays of one chunk, the last item (non-pixel bytes) is compressed as it is
+def _Compress(codec, level, delta, items):
+    compress = codecs[codec][0]
+    blobs = [compress(_Filter(item, delta), level) for item in items[:-1]]
+    blobs.append(compress(items[-1].tobytes(), level))
+    return blobs
+
+#chunkFrames / tileRows so that one blob (chunk x band of a region) is about blobBytes uncompressed: row tiles only when a
+#single frame of a region is larger than that, then as many frames per chunk as fit
+def _ChunkLayout(shapes, bpp, blobBytes, chunkFrames, tileRows):
+    if tileRows is None:
+        frames = 1 if chunkFrames is None else chunkFrames
+        tileRows = max(1, min(max(height for height, _ in shapes), blobBytes//max(1, frames*max(width for _, width in shapes)*bpp)))
+    if chunkFrames is None:
+        bandBytes = max(min(height, tileRows)*width*bpp for height, width in shapes)
+        chunkFrames = max(1, blobBytes//max(1, bandBytes))
+    return chunkFrames, tileRows
+
+#spe file --> archive, returns sizes, ratio and time taken
+#besides the blobs being compressed (about two blobs per worker), at most bufferBytes of chunks are read ahead of the writer
+def Convert(spePath: str, archivePath: str=None, *, chunkFrames: int=None, tileRows: int=None, codec: str='zlib', level: int=None,
+            workers: int=None, blobBytes: int=4<<20, bufferBytes: int=512<<20):
+    if codec not in codecs:
+        raise ValueError('codec must be one of %s (zstd / lz4 need the zstandard / lz4 packages)'%(', '.join(codecs)))
+    if (chunkFrames is not None and chunkFrames < 1) or (tileRows is not None and tileRows < 1):
+        raise ValueError('chunkFrames and tileRows must be at least 1')
+    if blobBytes < 1 or bufferBytes < 1:
+        raise ValueError('blobBytes and bufferBytes must be at least 1')
+    if archivePath is None:
+        archivePath = os.path.splitext(spePath)[0] + '.spez'
+    start = time.perf_counter()
+    with SpeReference(spePath) as spe:
+        if spe.speVersion >= 3 and int(spe.xmlLoc) == 0:
+            raise ValueError('%s is still being written (no xml footer)'%(spePath))
+        numFrames = int(spe.numFrames)
+        stride = int(spe.readoutStride)
+        bpp = spe.dataType.itemsize
+        delta = bool(np.issubdtype(spe.dataType, np.integer))
+        shapes = [(int(roi.height), int(roi.width)) for roi in spe.roiList]
+        chunkFrames, tileRows = _ChunkLayout(shapes, bpp, blobBytes, chunkFrames, tileRows)
+        #[start, stop) rows of each band per roi
+        bands = []
+        for height, _ in shapes:
+            bands.append([[bandStart, min(height, bandStart+tileRows)] for bandStart in range(0, height, tileRows)] or [[0, 0]])
+        #bytes of a readout that are not pixels (metadata, padding) are kept as they are
+        pixelMask = np.zeros(stride, dtype=bool)
+        for offset, (height, width) in zip(spe.roiOffsets, shapes):
+            pixelMask[offset:offset+height*width*bpp] = True
+        extraPositions = np.flatnonzero(~pixelMask)
+        dataEnd = 4100 + numFrames*stride
+        fileSize = os.path.getsize(spePath)
+        footerStart = int(spe.xmlLoc) if spe.speVersion >= 3 else fileSize
+        index = {'format': formatVersion, 'codec': codec, 'delta': delta, 'chunk_frames': chunkFrames, 'tile_rows': tileRows,
+                 'num_frames': numFrames, 'readout_stride': stride, 'data_type': spe.dataType.str, 'shapes': shapes, 'bands': bands,
+                 'extra_bytes': len(extraPositions), 'source_size': fileSize, 'chunks': []}
+        with open(spePath, 'rb') as source, open(archivePath, 'wb') as target:
+            header = source.read(4100)
+            target.write(magic + np.uint32(formatVersion).tobytes())
+            target.write(header)
+
+            #reads one chunk of readouts and cuts it into views of every (roi, band) into the block that was read, then the non-pixel bytes
+            def Items(first):
+                count = min(chunkFrames, numFrames-first)
+                source.seek(4100 + first*stride)
+                block = source.read(count*stride)
+                items = []
+                for offset, (height, width), roiBands in zip(spe.roiOffsets, shapes, bands):
+                    pixels = np.ndarray((count, height, width), dtype=spe.dataType, buffer=block, offset=offset,
+                                        strides=(stride, width*bpp, bpp))
+                    for bandStart, bandStop in roiBands:
+                        items.append(pixels[:, bandStart:bandStop])
+                items.append(np.frombuffer(block, dtype=np.uint8).reshape(count, stride)[:, extraPositions])
+                return first, count, items
+
+            position = target.tell()
+            #reading stays on this thread in file order, compression runs on the pool with at most bufferBytes of chunks in flight
+            workers = (os.cpu_count() or 1) if workers is None else workers
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = []
+                maxPending = max(1, min(2*workers, bufferBytes//max(1, chunkFrames*stride)))
+                firsts = iter(range(0, numFrames, chunkFrames))
+                while True:
+                    for first in firsts:
+                        chunk = Items(first)
+                        pending.append((chunk[0], chunk[1], pool.submit(_Compress, codec, level, delta, chunk[2])))
+                        if len(pending) >= maxPending:
+                            break
+                    if len(pending) == 0:
+                        break
+                    first, count, future = pending.pop(0)
+                    entry = {'first': first, 'count': count, 'blobs': []}
+                    for blob in future.result():
+                        target.write(blob)
+                        entry['blobs'].append([position, len(blob)])
+                        position += len(blob)
+                    index['chunks'].append(entry)
+            #whatever lies between the data block and the footer, then the footer itself, both verbatim
+            source.seek(dataEnd)
+            tail = source.read(max(0, footerStart-dataEnd))
+            index['tail'] = [position, len(tail)]
+            target.write(tail)
+            position += len(tail)
+            footer = source.read()
+            index['footer'] = [position, len(footer)]
+            target.write(footer)
+            position += len(footer)
+            indexBytes = json.dumps(index).encode('utf8')
+            target.write(indexBytes)
+            target.write(np.array([position, len(indexBytes)], dtype='<u8').tobytes() + magic)
+            archiveSize = target.tell()
+    return {'source': spePath, 'archive': archivePath, 'source_bytes': fileSize, 'archive_bytes': archiveSize,
+            'ratio': fileSize/archiveSize if archiveSize else 0.0, 'seconds': time.perf_counter()-start}
+
+#reader for archives written by Convert, same interface as SpeReference (without memory mapping)
+class SpeArchive(SpeReference):
+    def __init__(self, filePath: str, *, frameCache=None, cacheBytes: int=256<<20):
+        #decoded (chunk, blob) arrays, most recently used last, at most cacheBytes in total
+        self._chunkCache = OrderedDict()
+        self.cacheBytes = cacheBytes
+        self._cachedBytes = 0
+        self._chunkLock = threading.Lock()
+        #(chunk, blob) keys being decoded by some thread, others wait on the event instead of decoding the blob again
+        self._inFlight = {}
+        self.index = None
+        super().__init__(filePath, frameCache=frameCache)
+
+    def _LoadIndex(self):
+        with open(self.filePath, 'rb') as f:
+            if f.read(4) != magic:
+                raise ValueError('%s is not an spe archive'%(self.filePath))
+            version = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+            if version > formatVersion:
+                raise ValueError('%s has archive format %d, this reader handles up to %d'%(self.filePath, version, formatVersion))
+            header = f.read(4100)
+            f.seek(-20, os.SEEK_END)
+            trailer = f.read(20)
+            if trailer[16:] != magic:
+                raise ValueError('%s is truncated (no archive index)'%(self.filePath))
+            indexOffset, indexLength = (int(item) for item in np.frombuffer(trailer[:16], dtype='<u8'))
+            f.seek(indexOffset)
+            self.index = json.loads(f.read(indexLength).decode('utf8'))
+            if self.index['codec'] not in codecs:
+                raise ValueError('%s needs the %s codec, which is not installed'%(self.filePath, self.index['codec']))
+            f.seek(self.index['footer'][0])
+            footer = f.read(self.index['footer'][1])
+        self._chunkFirsts = np.array([chunk['first'] for chunk in self.index['chunks']], dtype=np.int64)
+        #blob number, first and last row of every band of each roi, the blob after the last band holds the non-pixel bytes
+        self._roiBlobs = []
+        blobIndex = 0
+        for roiBands in self.index['bands']:
+            self._roiBlobs.append([(blobIndex+band, bandStart, bandStop) for band, (bandStart, bandStop) in enumerate(roiBands)])
+            blobIndex += len(roiBands)
+        self._extraBlob = blobIndex
+        return header, footer
+
+    def InitializeSpe(self):
+        header, footer = self._LoadIndex()
+        #decoded the way SpeReference reads the footer from an spe file (text mode, universal newlines)
+        self._ParseHeader(header, io.TextIOWrapper(io.BytesIO(footer), encoding='utf8').read())
+
+    #the lock only guards the cache and the in-flight table, reads and decompression of different blobs run in parallel
+    def _Decoded(self, chunkIndex, blobIndex):
+        key = (chunkIndex, blobIndex)
+        while True:
+            with self._chunkLock:
+                if key in self._chunkCache:
+                    self._chunkCache.move_to_end(key)
+                    return self._chunkCache[key]
+                event = self._inFlight.get(key)
+                if event is None:
+                    event = self._inFlight[key] = threading.Event()
+                    break
+            event.wait()
+        data = None
+        try:
+            data = self._Decode(chunkIndex, blobIndex)
+        finally:
+            with self._chunkLock:
+                #blobs larger than the whole budget are not cached
+                if data is not None and data.nbytes <= self.cacheBytes:
+                    self._chunkCache[key] = data
+                    self._cachedBytes += data.nbytes
+                    while self._cachedBytes > self.cacheBytes:
+                        self._cachedBytes -= self._chunkCache.popitem(last=False)[1].nbytes
+                del self._inFlight[key]
+            event.set()
+        return data
+
+    def _Decode(self, chunkIndex, blobIndex):
+        offset, length = self.index['chunks'][chunkIndex]['blobs'][blobIndex]
+        with self._fileLock:
+            f = self._File()
+            f.seek(offset)
+            raw = f.read(length)
+            self.ioStats['bytes_read'] += length
+            self.ioStats['reads'] += 1
+            self.ioStats['largest_read'] = max(self.ioStats['largest_read'], length)
+        raw = codecs[self.index['codec']][1](raw)
+        count = self.index['chunks'][chunkIndex]['count']
+        if blobIndex == self._extraBlob:
+            return np.frombuffer(raw, dtype=np.uint8).reshape(count, self.index['extra_bytes'])
+        roi = next(roi for roi, roiBlobs in enumerate(self._roiBlobs) if roiBlobs[0][0] <= blobIndex <= roiBlobs[-1][0])
+        _, bandStart, bandStop = self._roiBlobs[roi][blobIndex-self._roiBlobs[roi][0][0]]
+        shape = (count, bandStop-bandStart, self.index['shapes'][roi][1])
+        return _Unfilter(raw, np.dtype(self.index['data_type']), shape, self.index['delta'])
+
+    #same contract as SpeReference._ReadFrames, the data comes from the chunks holding the requested frames and rows
+    def _ReadFrames(self, rois, frames, *, rowStart: int=0, rowStop: int=None, dtype=None, maxGap: int=None, maxRead: int=None,
+                    cached: bool=True, out: list=None):
+        frames = np.asarray(frames,dtype=np.int64)
+        dtype = self.dataType if dtype is None else dtype
+        if cached and self.frameCache is not None and rowStart == 0 and rowStop is None:
+            return self._ReadCached(rois, frames, dtype, out)
+        shapes = []
+        for roi in rois:
+            stop = int(self.roiList[roi].height) if rowStop is None else rowStop
+            shapes.append((stop-rowStart, int(self.roiList[roi].width)))
+        dataList = out if out is not None else [np.empty((len(frames),)+shape, dtype=dtype) for shape in shapes]
+        if len(frames) == 0:
+            return dataList
+        chunkIndices = np.searchsorted(self._chunkFirsts, frames, side='right')-1
+        for chunkIndex in np.unique(chunkIndices):
+            positions = np.flatnonzero(chunkIndices == chunkIndex)
+            local = frames[positions]-self._chunkFirsts[chunkIndex]
+            for k,roi in enumerate(rois):
+                stop = rowStart+shapes[k][0]
+                for blobIndex, bandStart, bandStop in self._roiBlobs[roi]:
+                    if bandStop <= rowStart or bandStart >= stop:
+                        continue
+                    data = self._Decoded(int(chunkIndex), blobIndex)
+                    first = max(rowStart, bandStart)
+                    last = min(stop, bandStop)
+                    dataList[k][positions, first-rowStart:last-rowStart] = data[local, first-bandStart:last-bandStart]
+        return dataList
+
+    #metadata records come from the stored non-pixel bytes, which end with the metadata of each readout
+    def _MetaRecords(self, layout):
+        metaStart = min(layout.fields[name][1] for name in layout.names)
+        metaSize = int(self.readoutStride)-metaStart
+        raw = np.empty((int(self.numFrames), metaSize), dtype=np.uint8)
+        for chunkIndex, chunk in enumerate(self.index['chunks']):
+            raw[chunk['first']:chunk['first']+chunk['count']] = self._Decoded(chunkIndex, self._extraBlob)[:, self.index['extra_bytes']-metaSize:]
+        records = np.dtype({'names': list(layout.names), 'formats': [layout.fields[name][0] for name in layout.names],
+                            'offsets': [layout.fields[name][1]-metaStart for name in layout.names], 'itemsize': metaSize})
+        return raw.view(records).reshape(-1)
+
+    def _MapData(self):
+        raise TypeError('spe archives are compressed and cannot be memory mapped')
+
+    #page cache hints go to the compressed blobs of the chunks holding the frames, not to spe readout offsets
+    def _FrameRuns(self, rois, frames):
+        ranges = []
+        for chunkIndex in np.unique(np.searchsorted(self._chunkFirsts, frames, side='right')-1):
+            blobs = self.index['chunks'][chunkIndex]['blobs']
+            for roi in rois:
+                first = self._roiBlobs[roi][0][0]
+                last = self._roiBlobs[roi][-1][0]
+                ranges.append((blobs[first][0], blobs[last][0]+blobs[last][1]-blobs[first][0]))
+        return ranges
+
+    #traces go through the chunks instead of a memory map
+    def _Trace(self, roi, frames, y, x):
+        if len(frames) == 0:
+            frames = np.arange(0,self.numFrames)
+        frames = self._CheckFrames(frames)
+        if isinstance(y, slice):
+            return self._ReadFrames([roi], frames, dtype=None)[0][:, :, x]
+        rowStart = int(np.min(y)) if np.size(y) > 0 else 0
+        rowStop = int(np.max(y))+1 if np.size(y) > 0 else 0
+        data = self._ReadFrames([roi], frames, rowStart=rowStart, rowStop=rowStop, dtype=None)[0]
+        return data[:, np.asarray(y)-rowStart, x]
+
+    def Close(self):
+        super().Close()
+        with self._chunkLock:
+            self._chunkCache = OrderedDict()
+            self._cachedBytes = 0
+
+#archive --> the original spe file, byte for byte
+def Extract(archivePath: str, spePath: str):
+    with SpeArchive(archivePath) as archive:
+        index = archive.index
+        stride = index['readout_stride']
+        pixelMask = np.zeros(stride, dtype=bool)
+        bpp = archive.dataType.itemsize
+        for offset, (height, width) in zip(archive.roiOffsets, index['shapes']):
+            pixelMask[offset:offset+height*width*bpp] = True
+        extraPositions = np.flatnonzero(~pixelMask)
+        with open(archivePath, 'rb') as source, open(spePath, 'wb') as target:
+            source.seek(8)
+            target.write(source.read(4100))
+            for chunkIndex, chunk in enumerate(index['chunks']):
+                count = chunk['count']
+                frames = np.arange(chunk['first'], chunk['first']+count)
+                block = np.empty((count, stride), dtype=np.uint8)
+                dataList = archive._ReadFrames(range(0,len(index['shapes'])), frames, dtype=None)
+                for offset, data in zip(archive.roiOffsets, dataList):
+                    block[:, offset:offset+data[0].nbytes] = data.reshape(count, -1).view(np.uint8)
+                block[:, extraPositions] = archive._Decoded(chunkIndex, archive._extraBlob)
+                target.write(block.tobytes())
+            for offset, length in (index['tail'], index['footer']):
+                source.seek(offset)
+                target.write(source.read(length))
+    return spePath
+
+if __name__=="__main__":
+    import argparse
+    import glob
+    parser = argparse.ArgumentParser(description='Convert spe files to chunked, compressed .spez archives')
+    parser.add_argument('paths', nargs='+', help='spe files or glob patterns')
+    parser.add_argument('--codec', default='zlib', choices=list(codecs))
+    parser.add_argument('--level', type=int, default=None)
+    parser.add_argument('--chunk-frames', type=int, default=None, help='frames per chunk (default: from --blob-mb)')
+    parser.add_argument('--tile-rows', type=int, default=None, help='rows per tile (default: from --blob-mb)')
+    parser.add_argument('--blob-mb', type=float, default=4, help='uncompressed size of one compressed piece, MiB')
+    parser.add_argument('--buffer-mb', type=float, default=512, help='memory for chunks read ahead of the writer, MiB')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--extract', action='store_true', help='turn .spez archives back into spe files')
+    args = parser.parse_args()
+    files = []
+    for item in args.paths:
+        files.extend(sorted(glob.glob(item)) if any(c in item for c in '*?[') else [item])
+    for item in files:
+        if args.extract:
+            print(Extract(item, os.path.splitext(item)[0] + '.spe'))
+            continue
+        result = Convert(item, chunkFrames=args.chunk_frames, tileRows=args.tile_rows, codec=args.codec, level=args.level, workers=args.workers,
+                         blobBytes=int(args.blob_mb*2**20), bufferBytes=int(args.buffer_mb*2**20))
+        print('%s: %0.1f MB --> %0.1f MB (%0.2fx) in %0.1f s'%(result['archive'], result['source_bytes']/1e6, result['archive_bytes']/1e6,
+                                                             result['ratio'], result['seconds']))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel statistics over directories of spe files
+
+usage:
+- from speBatch import BatchStats, WriteCsv
+- rows = BatchStats(glob.glob('C:/data/*.spe'), workers=8)
+----- one row (dict) per file, roi and frame: file, roi, frame, pixels, mean, std, min, max, sum, saturated
+----- level='file' gives one row per file and roi instead (frame is -1, frames holds the frame count)
+- WriteCsv(rows, 'stats.csv')
+- files are spread over a process pool, each worker streams its file in chunks of chunkFrames frames, so memory per worker stays bounded
+- on Windows, call BatchStats from under if __name__=="__main__": (process pool requirement)
+- can also run from the command line: python speBatch.py C:/data/*.spe --workers 8 --csv stats.csv
+"""
+
+import csv
+import functools
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from readSpe import SpeReference
+
+statFields = ['file', 'roi', 'frame', 'frames', 'pixels', 'mean', 'std', 'min', 'max', 'sum', 'saturated']
+
+#value counted as saturated: the top of the range for integer pixel types, none for floating point data
+def _SaturationLevel(dataType, saturation):
+    if saturation is not None:
+        return saturation
+    if np.issubdtype(dataType, np.integer):
+        return np.iinfo(dataType).max
+    return None
+
+#statistics for one file, runs inside a worker
+def FileStats(filePath: str, *, rois: list=[], chunkFrames: int=64, saturation=None, level: str='frame', dropCache: bool=False):
+    if level not in ('frame', 'file'):
+        raise ValueError('level must be frame or file')
+    #one sequential pass, dropCache keeps the pass from evicting everything else from the page cache
+    with SpeReference(filePath, accessPattern='sequential', dropCache=dropCache) as spe:
+        if len(rois) == 0:
+            rois = list(range(0,len(spe.roiList)))
+        satLevel = _SaturationLevel(spe.dataType, saturation)
+        frameRows = []
+        #per roi: frame means, variances, mins, maxs, sums, saturated counts
+        perRoi = {roi: ([], [], [], [], [], []) for roi in rois}
+        for frames, dataList in spe.IterFrames(rois=rois, chunkFrames=chunkFrames):
+            for roi, data in zip(rois, dataList):
+                pixels = data.shape[1]*data.shape[2]
+                if pixels == 0:
+                    continue
+                means = np.mean(data, axis=(1,2), dtype=np.float64)
+                variances = np.var(data, axis=(1,2), dtype=np.float64)
+                mins = np.min(data, axis=(1,2))
+                maxs = np.max(data, axis=(1,2))
+                sums = np.sum(data, axis=(1,2), dtype=np.float64)
+                if satLevel is None:
+                    saturated = np.zeros(len(frames), dtype=np.int64)
+                else:
+                    saturated = np.count_nonzero(data >= satLevel, axis=(1,2))
+                for values, new in zip(perRoi[roi], (means, variances, mins, maxs, sums, saturated)):
+                    values.append(new)
+                if level == 'frame':
+                    for j in range(0,len(frames)):
+                        frameRows.append({'file': filePath, 'roi': roi, 'frame': int(frames[j]), 'frames': 1, 'pixels': pixels,
+                                          'mean': float(means[j]), 'std': float(np.sqrt(variances[j])), 'min': mins[j].item(),
+                                          'max': maxs[j].item(), 'sum': float(sums[j]), 'saturated': int(saturated[j])})
+        if level == 'frame':
+            return frameRows
+        fileRows = []
+        for roi in rois:
+            if len(perRoi[roi][0]) == 0:
+                continue
+            means, variances, mins, maxs, sums, saturated = [np.concatenate(values) for values in perRoi[roi]]
+            #frames all have the same pixel count, so pooled variance is the mean within-frame variance plus the spread of frame means
+            mean = np.mean(means)
+            variance = np.mean(variances) + np.mean((means-mean)**2)
+            fileRows.append({'file': filePath, 'roi': roi, 'frame': -1, 'frames': len(means),
+                             'pixels': int(spe.roiList[roi].width)*int(spe.roiList[roi].height),
+                             'mean': float(mean), 'std': float(np.sqrt(variance)), 'min': mins.min().item(), 'max': maxs.max().item(),
+                             'sum': float(np.sum(sums)), 'saturated': int(np.sum(saturated))})
+        return fileRows
+
+#runs FileStats over every file on a process pool, rows come back in file order
+def BatchStats(paths, *, rois: list=[], chunkFrames: int=64, workers: int=None, saturation=None, level: str='frame', dropCache: bool=False):
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(paths))
+    work = functools.partial(FileStats, rois=rois, chunkFrames=chunkFrames, saturation=saturation, level=level, dropCache=dropCache)
+    rows = []
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            rows.extend(work(path))
+        return rows
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for fileRows in pool.map(work, paths):
+            rows.extend(fileRows)
+    return rows
+
+def WriteCsv(rows, csvPath: str):
+    with open(csvPath, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=statFields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Per-frame / per-file statistics for spe files')
+    parser.add_argument('paths', nargs='+', help='spe files or glob patterns')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-frames', type=int, default=64)
+    parser.add_argument('--level', choices=['frame','file'], default='frame')
+    parser.add_argument('--drop-cache', action='store_true', help='release file pages from the page cache once read (Linux)')
+    parser.add_argument('--csv', default=None, help='write rows to this csv file instead of stdout')
+    args = parser.parse_args()
+    files = []
+    for item in args.paths:
+        files.extend(sorted(glob.glob(item)) if any(c in item for c in '*?[') else [item])
+    result = BatchStats([item for item in files if os.path.isfile(item)], chunkFrames=args.chunk_frames, workers=args.workers, level=args.level,
+                        dropCache=args.drop_cache)
+    if args.csv is not None:
+        WriteCsv(result, args.csv)
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=statFields)
+        writer.writeheader()
+        writer.writerows(result)
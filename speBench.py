@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic spe files and reader benchmarks
+
+usage:
+- from speBench import MakeSpe3, MakeSpe2, RunBenchmarks
+- MakeSpe3('test.spe', width=512, height=512, frames=100, rois=2, pixelFormat='MonochromeFloating32', meta=True)
+----- writes a LightField style spe3 file (regions, per-frame metadata, wavelength calibration, camera settings in the footer)
+- MakeSpe2('test2.spe', width=512, height=512, frames=100, dataType=np.uint16) writes a WinSpec style spe2.x file
+- report = RunBenchmarks(sizes=['small'], formats=['MonochromeUnsigned16'], rois=[1,4], meta=[False,True])
+----- generates each file in the matrix, times readSpe(), SpeReference header parsing, GetData (whole file and single frames),
+----- IterFrames and the settings queries, each case in a fresh process so peak RSS belongs to that case
+----- results: seconds (mean, p50, p95, p99), GB/s, frames/s, peak RSS in MB
+- command line: python speBench.py --sizes small medium --json bench.json (compare the json files between versions)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+from readSpe import readSpe, SpeReference, SpeWriter, MetaContainer, ROI
+from speXml import IndexFooter, GetSettingsSummary
+
+#sensor width, height and frame count for each size preset
+sizePresets = {'tiny': (64, 64, 16), 'small': (256, 256, 200), 'medium': (1024, 1024, 64), 'large': (2048, 2048, 128), 'huge': (4096, 4096, 32)}
+pixelFormats = ['MonochromeUnsigned16', 'MonochromeUnsigned32', 'MonochromeFloating32']
+benchmarks = ['header', 'settings', 'readSpe', 'getdata_all', 'getdata_frame', 'iterframes']
+
+#camera settings for the footer, so settings queries have something to find
+_settingsXml = '''<DataHistories><DataHistory><Origin softwareVersion="6.16" created="2024-01-01T00:00:00">
+<Experiment><System><Cameras><Camera model="SYNTHETIC" serialNumber="0000" /></Cameras></System>
+<Devices><Cameras><Camera><Sensor><Information><SensorName>Synthetic</SensorName><Pixel><Width>13.5</Width></Pixel></Information>
+<Temperature><Reading>-70</Reading><Status>Locked</Status></Temperature></Sensor>
+<ShutterTiming><ExposureTime>100</ExposureTime><Mode>Normal</Mode></ShutterTiming>
+<ReadoutControl><Mode>FullFrame</Mode><Time>50</Time><PortsUsed>1</PortsUsed><Accumulations>1</Accumulations></ReadoutControl>
+<HardwareIO><Trigger><Source>Internal</Source><Frequency>0</Frequency></Trigger></HardwareIO>
+<Adc><Speed>2</Speed><AnalogGain>Medium</AnalogGain><Quality>LowNoise</Quality><BitDepth>16</BitDepth></Adc>
+<Acquisition><FrameRate>10</FrameRate></Acquisition></Camera></Cameras>
+<Spectrometers><Spectrometer><Grating><Selected>[500nm,300][1][0]</Selected><CenterWavelength>600</CenterWavelength></Grating></Spectrometer></Spectrometers>
+</Devices></Experiment></Origin></DataHistory></DataHistories>'''
+
+def _Frames(rng, dataType, count, height, width):
+    if np.issubdtype(dataType, np.integer):
+        return rng.integers(0, 4096, size=(count, height, width), dtype=dataType)
+    return (rng.random((count, height, width), dtype=np.float32)*4096).astype(dataType)
+
+#spe3 file with rois horizontal bands of the sensor, optional timestamp/frame tracking metadata and wavelength calibration
+def MakeSpe3(filePath: str, *, width: int, height: int, frames: int, rois: int=1, pixelFormat: str='MonochromeUnsigned16',
+             meta: bool=False, wavelength: bool=True, seed: int=0, chunkFrames: int=16):
+    if rois < 1 or rois > height:
+        raise ValueError('rois must be between 1 and the height (%d)'%(height))
+    rng = np.random.default_rng(seed)
+    dataType = SpeReference.dataTypes[pixelFormat]
+    bandHeights = [height//rois + (1 if i < height%rois else 0) for i in range(0,rois)]
+    roiList = []
+    y = 0
+    for bandHeight in bandHeights:
+        roi = ROI(width, bandHeight, 0)
+        roi.Y = y
+        roiList.append(roi)
+        y += bandHeight
+    metaList = []
+    if meta:
+        metaList = [MetaContainer('TimeStamp', 8, metaEvent='ExposureStarted', metaResolution=1000000, metaDataType='Int64'),
+                    MetaContainer('TimeStamp', 8, metaEvent='ExposureEnded', metaResolution=1000000, metaDataType='Int64'),
+                    MetaContainer('FrameTrackingNumber', 8, metaDataType='Int64')]
+    wavelengths = np.linspace(500, 700, width) if wavelength else None
+    with SpeWriter(filePath, roiList, pixelFormat=pixelFormat, metaList=metaList, wavelength=wavelengths,
+                   sensorDims=ROI(width, height, 0), extraXml=_settingsXml) as writer:
+        for start in range(0,frames,chunkFrames):
+            count = min(chunkFrames, frames-start)
+            metadata = None
+            if meta:
+                index = np.arange(start, start+count, dtype=np.int64)
+                metadata = np.stack([index*100000, index*100000+50000, index+1], axis=1).view(np.uint8)
+            writer.WriteFrames([_Frames(rng, dataType, count, bandHeight, width) for bandHeight in bandHeights], metadata=metadata)
+    return filePath
+
+#spe2.x file: 4100 byte header with the legacy fields, then the frames, no footer
+def MakeSpe2(filePath: str, *, width: int, height: int, frames: int, dataType=np.uint16, seed: int=0, chunkFrames: int=16):
+    codes = {np.dtype(value): key for key, value in SpeReference.dataTypes2.items()}
+    if np.dtype(dataType) not in codes:
+        raise ValueError('dataType must be one of %s'%(', '.join(str(np.dtype(item)) for item in SpeReference.dataTypes2.values())))
+    if width > 65535 or height > 65535:
+        raise ValueError('spe2.x frames are limited to 65535 x 65535')
+    rng = np.random.default_rng(seed)
+    header = bytearray(4100)
+    np.frombuffer(header, dtype=np.uint16, count=1, offset=42)[0] = width
+    np.frombuffer(header, dtype=np.int16, count=1, offset=108)[0] = codes[np.dtype(dataType)]
+    np.frombuffer(header, dtype=np.uint16, count=1, offset=656)[0] = height
+    np.frombuffer(header, dtype=np.int32, count=1, offset=1446)[0] = frames
+    np.frombuffer(header, dtype=np.float32, count=1, offset=1992)[0] = 2.5
+    np.frombuffer(header, dtype=np.int16, count=1, offset=4098)[0] = 0x5555
+    with open(filePath, 'wb') as f:
+        f.write(header)
+        for start in range(0,frames,chunkFrames):
+            f.write(_Frames(rng, np.dtype(dataType), min(chunkFrames, frames-start), height, width).tobytes())
+    return filePath
+
+#peak resident set size of this process in MB, None where the resource module is missing (Windows)
+def _PeakRss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return peak/(1 << 20) if sys.platform == 'darwin' else peak/1024
+
+def _Summary(seconds, *, nbytes: int=0, frames: int=0):
+    seconds = np.asarray(seconds, dtype=np.float64)
+    result = {'repeats': len(seconds), 'mean': float(seconds.mean()), 'p50': float(np.percentile(seconds, 50)),
+              'p95': float(np.percentile(seconds, 95)), 'p99': float(np.percentile(seconds, 99))}
+    mean = max(result['mean'], 1e-12)
+    if nbytes:
+        result['gb_per_s'] = nbytes/mean/1e9
+    if frames:
+        result['frames_per_s'] = frames/mean
+    return result
+
+def _Time(func, repeats: int):
+    seconds = []
+    for _ in range(0,repeats):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter()-start)
+    return seconds
+
+#times every benchmark on one file, meant to run in its own process
+def BenchFile(filePath: str, *, repeats: int=5, frameRepeats: int=200, chunkFrames: int=64, only: list=None):
+    only = benchmarks if only is None else only
+    results = {}
+    baseRss = _PeakRss()
+    with SpeReference(filePath) as spe:
+        numFrames = int(spe.numFrames)
+        nbytes = numFrames*sum(int(roi.width)*int(roi.height) for roi in spe.roiList)*spe.dataType.itemsize
+        isSpe3 = spe.speVersion >= 3
+    if 'header' in only:
+        def Header():
+            IndexFooter.cache_clear()
+            SpeReference(filePath).Close()
+        results['header'] = _Summary(_Time(Header, max(repeats, 20)))
+    if 'settings' in only and isSpe3:
+        with SpeReference(filePath) as spe:
+            footer = spe.xmlFooter
+        def Settings():
+            IndexFooter.cache_clear()
+            GetSettingsSummary(IndexFooter(footer))
+        results['settings'] = _Summary(_Time(Settings, max(repeats, 20)))
+    if 'readSpe' in only:
+        try:
+            results['readSpe'] = _Summary(_Time(lambda: readSpe(filePath), repeats), nbytes=nbytes, frames=numFrames)
+        except Exception as error:
+            results['readSpe'] = {'error': '%s: %s'%(type(error).__name__, error)}
+    with SpeReference(filePath) as spe:
+        if 'getdata_all' in only:
+            results['getdata_all'] = _Summary(_Time(lambda: spe.GetData(), repeats), nbytes=nbytes, frames=numFrames)
+        if 'getdata_frame' in only:
+            rng = np.random.default_rng(0)
+            order = iter(rng.integers(0, numFrames, size=frameRepeats))
+            results['getdata_frame'] = _Summary(_Time(lambda: spe.GetData(frames=[next(order)]), frameRepeats),
+                                                nbytes=nbytes//numFrames, frames=1)
+        if 'iterframes' in only:
+            def Iterate():
+                for _ in spe.IterFrames(chunkFrames=chunkFrames):
+                    pass
+            results['iterframes'] = _Summary(_Time(Iterate, repeats), nbytes=nbytes, frames=numFrames)
+    return {'results': results, 'bytes': nbytes, 'frames': numFrames, 'base_rss_mb': baseRss, 'peak_rss_mb': _PeakRss()}
+
+def _Cases(sizeNames, formatNames, roiCounts, metaOptions, wavelengthOptions, spe2):
+    cases = []
+    for sizeName, pixelFormat, rois, meta, wavelength in itertools.product(sizeNames, formatNames, roiCounts, metaOptions, wavelengthOptions):
+        cases.append({'version': 3, 'size': sizeName, 'pixel_format': pixelFormat, 'rois': rois, 'meta': meta, 'wavelength': wavelength})
+    if spe2:
+        for sizeName, pixelFormat in itertools.product(sizeNames, formatNames):
+            cases.append({'version': 2, 'size': sizeName, 'pixel_format': pixelFormat, 'rois': 1, 'meta': False, 'wavelength': False})
+    return cases
+
+#generates each file of the matrix, benchmarks it in a fresh process and deletes it again (unless keep)
+def RunBenchmarks(*, sizes: list=['small'], formats: list=pixelFormats, rois: list=[1, 4], meta: list=[False, True], wavelength: list=[True],
+                  spe2: bool=True, repeats: int=5, frameRepeats: int=200, only: list=None, directory: str=None, keep: bool=False, log=None):
+    for sizeName in sizes:
+        if sizeName not in sizePresets:
+            raise ValueError('size must be one of %s'%(', '.join(sizePresets)))
+    for pixelFormat in formats:
+        if pixelFormat not in pixelFormats:
+            raise ValueError('pixel format must be one of %s'%(', '.join(pixelFormats)))
+    workDir = tempfile.mkdtemp(prefix='speBench', dir=directory)
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+              'machine': platform.machine(), 'cpus': os.cpu_count(), 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'cases': []}
+    try:
+        for i, case in enumerate(_Cases(sizes, formats, rois, meta, wavelength, spe2)):
+            width, height, frames = sizePresets[case['size']]
+            filePath = os.path.join(workDir, 'case%03d.spe'%(i))
+            start = time.perf_counter()
+            if case['version'] == 3:
+                MakeSpe3(filePath, width=width, height=height, frames=frames, rois=case['rois'], pixelFormat=case['pixel_format'],
+                         meta=case['meta'], wavelength=case['wavelength'], seed=i)
+            else:
+                MakeSpe2(filePath, width=width, height=height, frames=frames, dataType=SpeReference.dataTypes[case['pixel_format']], seed=i)
+            case = dict(case, width=width, height=height, file_bytes=os.path.getsize(filePath), generate_seconds=time.perf_counter()-start)
+            #fresh process per case, so peak RSS is that case's and the page cache is the only thing shared
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                case.update(pool.submit(BenchFile, filePath, repeats=repeats, frameRepeats=frameRepeats, only=only).result())
+            report['cases'].append(case)
+            if log is not None:
+                log(case)
+            if not keep:
+                os.remove(filePath)
+    finally:
+        if not keep:
+            shutil.rmtree(workDir, ignore_errors=True)
+    return report
+
+def _LogCase(case):
+    parts = []
+    for name, result in case['results'].items():
+        if 'error' in result:
+            parts.append('%s error'%(name))
+        elif 'gb_per_s' in result:
+            parts.append('%s %.2f GB/s'%(name, result['gb_per_s']))
+        else:
+            parts.append('%s %.2f ms'%(name, result['p50']*1e3))
+    print('spe%d %s %s rois=%d meta=%d wl=%d: %s'%(case['version'], case['size'], case['pixel_format'], case['rois'], case['meta'],
+                                                   case['wavelength'], ', '.join(parts)), file=sys.stderr)
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description='Synthetic spe files and reader benchmarks, results as json')
+    parser.add_argument('--sizes', nargs='+', default=['small'], choices=list(sizePresets))
+    parser.add_argument('--formats', nargs='+', default=pixelFormats, choices=pixelFormats)
+    parser.add_argument('--rois', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--meta', nargs='+', type=int, default=[0, 1], choices=[0, 1])
+    parser.add_argument('--wavelength', nargs='+', type=int, default=[1], choices=[0, 1])
+    parser.add_argument('--no-spe2', action='store_true', help='skip the spe2.x cases')
+    parser.add_argument('--only', nargs='+', default=None, choices=benchmarks)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--frame-repeats', type=int, default=200)
+    parser.add_argument('--dir', default=None, help='where the synthetic files are written (default: system temp)')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic files')
+    parser.add_argument('--json', default=None, help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+    result = RunBenchmarks(sizes=args.sizes, formats=args.formats, rois=args.rois, meta=[bool(item) for item in args.meta],
+                           wavelength=[bool(item) for item in args.wavelength], spe2=not args.no_spe2, repeats=args.repeats,
+                           frameRepeats=args.frame_repeats, only=args.only, directory=args.dir, keep=args.keep, log=_LogCase)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=1)
+    else:
+        json.dump(result, sys.stdout, indent=1)
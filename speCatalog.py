@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite catalog of spe files, indexed by the settings in their xml footers
+
+usage:
+- from speCatalog import SpeCatalog
+- with SpeCatalog('catalog.db') as catalog:
+-     catalog.Index('C:/data')            (recursive; only new or changed files are parsed, files gone from disk are dropped)
+-     catalog.Find(exposure=100, sensor_temperature=-70, grating_density=1200)
+-     catalog.Query('exposure >= ? AND adc_speed = ? ORDER BY created', (50, 2))
+----- both return a list of dicts, one per file, with the columns of SpeInfo (see speInfo.py) plus grating_density,
+----- width/height of the first region and num_regions; list valued entries (regions, metadata, corrections...) are json text
+- Find matches floats within tolerance (default 1e-6 relative), other values exactly
+- command line: python speCatalog.py catalog.db index C:/data ; python speCatalog.py catalog.db find exposure=100 grating_density=1200
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from speInfo import SpeInfos
+
+#catalog columns and their sqlite types, settings names match GetSettingsSummary
+columns = {
+    'size': 'INTEGER', 'mtime_ns': 'INTEGER', 'indexed': 'REAL', 'status': 'TEXT', 'error': 'TEXT',
+    'spe_version': 'REAL', 'frames': 'INTEGER', 'pixel_type': 'TEXT', 'num_regions': 'INTEGER', 'width': 'INTEGER', 'height': 'INTEGER',
+    'regions': 'TEXT', 'metadata': 'TEXT', 'created': 'TEXT', 'lf_version': 'TEXT',
+    'camera_model': 'TEXT', 'camera_serial': 'TEXT', 'spectrometer_model': 'TEXT', 'spectrometer_serial': 'TEXT',
+    'sensor_name': 'TEXT', 'pixel_width': 'REAL', 'sensor_temperature': 'REAL', 'temperature_status': 'TEXT', 'vacuum_status': 'TEXT',
+    'clean_serial_register': 'INTEGER', 'clean_until_trigger': 'INTEGER', 'exposure': 'REAL', 'shutter_mode': 'TEXT',
+    'gate_mode': 'TEXT', 'gate_start_width': 'REAL', 'gate_start_delay': 'REAL', 'gate_end_width': 'REAL', 'gate_end_delay': 'REAL',
+    'intensifier_gain': 'REAL', 'intensifier_status': 'TEXT', 'emi_gain': 'REAL', 'readout_mode': 'TEXT', 'readout_time': 'REAL',
+    'storage_shift_rate': 'REAL', 'vertical_shift_rate': 'REAL', 'ports_used': 'INTEGER', 'accumulations': 'INTEGER',
+    'trigger_source': 'TEXT', 'trigger_frequency': 'REAL', 'adc_speed': 'REAL', 'analog_gain': 'TEXT', 'em_gain': 'REAL',
+    'adc_quality': 'TEXT', 'pixel_bias_correction': 'INTEGER', 'bit_depth': 'INTEGER', 'frame_rate': 'REAL',
+    'frame_combination': 'TEXT', 'frames_combined': 'INTEGER', 'corrections': 'TEXT', 'grating': 'TEXT', 'grating_density': 'INTEGER',
+    'center_wavelength': 'REAL', 'step_and_glue': 'TEXT', 'calibrations': 'TEXT',
+}
+#columns that get an sqlite index, the usual query keys
+indexedColumns = ['exposure', 'sensor_temperature', 'grating_density', 'center_wavelength', 'adc_speed', 'created', 'camera_serial']
+
+#LightField grating names look like [500nm,1200][1][0] (blaze, grooves/mm, turret position)
+_gratingDensity = re.compile(r'\[[^\],]*,\s*(\d+)\]')
+
+def _Row(info, size, mtimeNs):
+    row = {name: None for name in columns}
+    for name, value in info.items():
+        if name in row:
+            row[name] = json.dumps(value) if isinstance(value, (list, tuple)) else value
+    row['size'] = size
+    row['mtime_ns'] = mtimeNs
+    row['indexed'] = time.time()
+    row['status'] = 'error' if 'error' in info else info.get('status')
+    regions = info.get('regions') or []
+    row['num_regions'] = len(regions)
+    if len(regions) > 0:
+        row['width'] = regions[0]['width']
+        row['height'] = regions[0]['height']
+    if isinstance(info.get('grating'), str):
+        match = _gratingDensity.search(info['grating'])
+        if match is not None:
+            row['grating_density'] = int(match.group(1))
+    return row
+
+class SpeCatalog:
+    version = 1
+    def __init__(self, dbPath: str):
+        self.dbPath = dbPath
+        self._db = sqlite3.connect(dbPath)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('CREATE TABLE IF NOT EXISTS catalog_info (key TEXT PRIMARY KEY, value TEXT)')
+        stored = self._db.execute("SELECT value FROM catalog_info WHERE key = 'version'").fetchone()
+        if stored is not None and int(stored['value']) != self.version:
+            #older layout, rebuilt on the next Index
+            self._db.execute('DROP TABLE IF EXISTS files')
+        self._db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, %s)'%(', '.join('%s %s'%(name, sqlType) for name, sqlType in columns.items())))
+        for name in indexedColumns:
+            self._db.execute('CREATE INDEX IF NOT EXISTS files_%s ON files (%s)'%(name, name))
+        self._db.execute("INSERT OR REPLACE INTO catalog_info VALUES ('version', ?)", (str(self.version),))
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    def Close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    #adds new and changed files (size or mtime differ) under the given files / directories, and drops catalogued files
+    #inside those directories that no longer exist. Returns counts of added, updated, unchanged and removed files
+    def Index(self, paths, *, recursive: bool=True, workers: int=None):
+        if isinstance(paths, str):
+            paths = [paths]
+        found = {}
+        directories = []
+        for path in paths:
+            if os.path.isdir(path):
+                directories.append(os.path.abspath(path))
+                for filePath in self._Walk(path, recursive):
+                    found[os.path.abspath(filePath)] = None
+            elif os.path.isfile(path):
+                found[os.path.abspath(path)] = None
+        known = {}
+        for row in self._db.execute('SELECT path, size, mtime_ns FROM files'):
+            known[row['path']] = (row['size'], row['mtime_ns'])
+        changed = []
+        for filePath in found:
+            try:
+                stat = os.stat(filePath)
+            except OSError:
+                continue
+            found[filePath] = (stat.st_size, stat.st_mtime_ns)
+            if known.get(filePath) != found[filePath]:
+                changed.append(filePath)
+        counts = {'added': 0, 'updated': 0, 'unchanged': len(found)-len(changed), 'removed': 0}
+        insert = 'INSERT OR REPLACE INTO files (path, %s) VALUES (?%s)'%(', '.join(columns), ', ?'*len(columns))
+        with self._db:
+            for filePath, info in zip(changed, SpeInfos(changed, workers=workers)):
+                size, mtimeNs = found[filePath]
+                row = _Row(info, size, mtimeNs)
+                self._db.execute(insert, [filePath] + [row[name] for name in columns])
+                counts['updated' if filePath in known else 'added'] += 1
+            for filePath in known:
+                inside = any(filePath.startswith(directory+os.sep) and (recursive or os.path.dirname(filePath) == directory)
+                             for directory in directories)
+                if inside and filePath not in found:
+                    self._db.execute('DELETE FROM files WHERE path = ?', (filePath,))
+                    counts['removed'] += 1
+        return counts
+
+    @staticmethod
+    def _Walk(directory, recursive):
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if name.lower().endswith('.spe'):
+                    yield os.path.join(root, name)
+            if not recursive:
+                break
+
+    #rows matching an sql condition on the catalog columns, e.g. Query('exposure = ? AND grating_density = ?', (100, 1200))
+    def Query(self, where: str='1', params=()):
+        return [dict(row) for row in self._db.execute('SELECT * FROM files WHERE %s'%(where), params)]
+
+    #rows equal to every given column value, floats compared with a relative tolerance
+    def Find(self, *, tolerance: float=1e-6, **criteria):
+        conditions = []
+        params = []
+        for name, value in criteria.items():
+            if name not in columns and name != 'path':
+                raise ValueError('Unknown catalog column %s'%(name))
+            if value is None:
+                conditions.append('%s IS NULL'%(name))
+            elif isinstance(value, float):
+                conditions.append('%s BETWEEN ? AND ?'%(name))
+                margin = abs(value)*tolerance
+                params.extend((value-margin, value+margin))
+            else:
+                conditions.append('%s = ?'%(name))
+                params.append(value)
+        return self.Query(' AND '.join(conditions) if conditions else '1', params)
+
+    #removes one file, or everything if no file is given
+    def Invalidate(self, filePath: str=None):
+        with self._db:
+            if filePath is None:
+                self._db.execute('DELETE FROM files')
+            else:
+                self._db.execute('DELETE FROM files WHERE path = ?', (os.path.abspath(filePath),))
+
+def _Criterion(text):
+    name, value = text.split('=', 1)
+    for convert in (int, float):
+        try:
+            return name, convert(value)
+        except ValueError:
+            pass
+    return name, value
+
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='SQLite catalog of spe files indexed by footer settings')
+    parser.add_argument('db', help='catalog database file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    indexCommand = commands.add_parser('index', help='add new / changed files')
+    indexCommand.add_argument('paths', nargs='+')
+    indexCommand.add_argument('--no-recursive', action='store_true')
+    indexCommand.add_argument('--workers', type=int, default=None)
+    findCommand = commands.add_parser('find', help='files matching column=value criteria')
+    findCommand.add_argument('criteria', nargs='*', help='e.g. exposure=100 sensor_temperature=-70 grating_density=1200')
+    queryCommand = commands.add_parser('query', help='files matching an sql condition')
+    queryCommand.add_argument('where')
+    args = parser.parse_args()
+    with SpeCatalog(args.db) as catalog:
+        if args.command == 'index':
+            start = time.perf_counter()
+            counts = catalog.Index(args.paths, recursive=not args.no_recursive, workers=args.workers)
+            print('%(added)d added, %(updated)d updated, %(unchanged)d unchanged, %(removed)d removed'%(counts)
+                  + ' in %0.2f s'%(time.perf_counter()-start), file=sys.stderr)
+        else:
+            try:
+                rows = catalog.Find(**dict(_Criterion(item) for item in args.criteria)) if args.command == 'find' else catalog.Query(args.where)
+            except (ValueError, sqlite3.Error) as error:
+                sys.exit(str(error))
+            for row in rows:
+                print(json.dumps(row))
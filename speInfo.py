@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Headless summary of spe files: data layout and the experiment settings printed by showSpeMPL
+
+usage:
+- python speInfo.py C:/data/*.spe                  (text, one block per file)
+- python speInfo.py C:/data/*.spe --json out.json  (list of dicts; --jsonl prints one json object per line as files finish)
+- from speInfo import SpeInfo; SpeInfo(file) --> dict
+- only the 4100 byte header and the xml footer are read, and numpy / matplotlib / tk are never imported,
+  so it starts fast and many files are handled in parallel (--workers, process pool)
+- files still being acquired (no footer yet) are reported with status 'acquiring'
+"""
+
+import argparse
+import glob
+import json
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from speXml import XmlIndex, GetSettingsSummary
+
+#spe2.x data type codes, same table as SpeReference.dataTypes2
+dataTypes2 = {0:'float32', 1:'int32', 2:'int16', 3:'uint16', 5:'float64', 6:'uint8', 8:'uint32'}
+
+#layout and settings of one file, read from header + footer only
+def SpeInfo(filePath: str) -> dict:
+    info = {'file': filePath, 'size': os.path.getsize(filePath)}
+    with open(filePath, 'rb') as f:
+        header = f.read(4100)
+        if len(header) < 4100:
+            raise ValueError('%s is too short for an spe header'%(filePath))
+        xmlLoc = struct.unpack_from('<Q', header, 678)[0]
+        version = struct.unpack_from('<f', header, 1992)[0]
+        info['spe_version'] = round(version, 2)
+        if version < 3:
+            width, height = struct.unpack_from('<H', header, 42)[0], struct.unpack_from('<H', header, 656)[0]
+            code = struct.unpack_from('<h', header, 108)[0]
+            if code not in dataTypes2:
+                raise ValueError('%s has unknown spe2.x data type %d'%(filePath, code))
+            info.update({'status': 'complete', 'frames': struct.unpack_from('<i', header, 1446)[0], 'pixel_type': dataTypes2[code],
+                         'regions': [{'width': width, 'height': height}]})
+            return info
+        if xmlLoc == 0:
+            info['status'] = 'acquiring'
+            return info
+        f.seek(xmlLoc)
+        footer = f.read().decode('utf8')
+    index = XmlIndex(footer)
+    frameBlock = index.GetEntry('DataFormat/DataBlock')
+    info['status'] = 'complete'
+    info['frames'] = int(frameBlock.attrib.get('count', 0)) if frameBlock is not None else None
+    info['pixel_type'] = frameBlock.attrib.get('pixelFormat') if frameBlock is not None else None
+    info['regions'] = [{'width': int(entry.attrib.get('width', 0)), 'height': int(entry.attrib.get('height', 0))}
+                       for entry in index.GetAll('DataFormat/DataBlock/DataBlock')]
+    info['metadata'] = [entry.attrib.get('event') or entry.tag+entry.attrib.get('component', '') for entry in index.entries
+                        if entry.path.rsplit('/', 1)[0] == 'MetaFormat/MetaBlock']
+    #acquisition time as written by LightField, e.g. 2021-02-10T15:26:03.84-05:00
+    info['created'] = index.GetAttribute('DataHistories/DataHistory/Origin', 'created')
+    info.update(GetSettingsSummary(index))
+    return info
+
+#SpeInfo that reports a broken file instead of raising, so one bad file doesn't stop a batch
+def _SafeInfo(filePath):
+    try:
+        return SpeInfo(filePath)
+    except (OSError, ValueError, struct.error, ET.ParseError, UnicodeDecodeError) as error:
+        return {'file': filePath, 'error': '%s: %s'%(type(error).__name__, error)}
+
+#infos in file order, spread over a process pool when there is more than one file
+def SpeInfos(paths, *, workers: int=None):
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            yield _SafeInfo(path)
+        return
+    #imported here, multiprocessing is a good part of the start-up time and isn't needed for a single file
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_SafeInfo, paths, chunksize=16)
+
+def _Text(info):
+    lines = [info['file']]
+    for key, value in info.items():
+        if key == 'file' or value is None or value == []:
+            continue
+        if key == 'regions':
+            value = ', '.join('%dx%d'%(region['width'], region['height']) for region in value)
+        elif isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        lines.append('  %-22s %s'%(key+':', value))
+    return '\n'.join(lines)
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description='Layout and settings summary of spe files (header and footer only)')
+    parser.add_argument('paths', nargs='+', help='spe files, directories or glob patterns')
+    parser.add_argument('--workers', type=int, default=None)
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--json', default=None, metavar='PATH', help="write a json list to this file ('-' for stdout)")
+    output.add_argument('--jsonl', action='store_true', help='print one json object per file')
+    args = parser.parse_args()
+    files = []
+    for item in args.paths:
+        if os.path.isdir(item):
+            #both patterns match the same files on case-insensitive file systems
+            files.extend(sorted(set(glob.glob(os.path.join(item, '*.spe')) + glob.glob(os.path.join(item, '*.SPE')))))
+        elif any(c in item for c in '*?['):
+            files.extend(sorted(glob.glob(item)))
+        else:
+            files.append(item)
+    failed = False
+    infos = []
+    for info in SpeInfos(files, workers=args.workers):
+        failed = failed or 'error' in info
+        if args.jsonl:
+            print(json.dumps(info), flush=True)
+        elif args.json is not None:
+            infos.append(info)
+        else:
+            print(info['file']+': '+info['error'] if 'error' in info else _Text(info))
+    if args.json == '-':
+        json.dump(infos, sys.stdout, indent=1)
+    elif args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(infos, f, indent=1)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Watch-folder ingestion of newly acquired spe files
+
+usage:
+- from speWatch import SpeWatcher
+- watcher = SpeWatcher('C:/data', [Stage1, Stage2], checkpointPath='C:/data/.speWatch.json', workers=4)
+- watcher.Run()     (until watcher.Stop() from another thread, Ctrl+C, or timeout= / maxFiles=)
+----- every stage is called as stage(context) in order, context is a dict with file, size, mtime_ns that stages can add results to
+----- e.g. def Stage1(context): context['dark'] = SpeReference(context['file']).Reduce('mean', rois=[0])[0]
+- the directory is usually LightField's FileNameGenerationDirectory (experiment.GetValue(ExperimentSettings.FileNameGenerationDirectory))
+- a file is handed on once it is complete: spe3 footer written (xml offset set) and size/mtime unchanged for settleTime seconds
+- at most maxPending files are queued or in work, the rest wait on disk until the pool catches up (backpressure)
+- processed and failed files are kept in the checkpoint json (path, size, mtime), so a restart only picks up new or rewritten files
+- a poll only lists a directory again when its mtime changed, and only stats new names and files not handed on yet; files already
+  processed are checked for rewrites every rescanInterval seconds, so polling stays cheap in directories with many files
+- command line: python speWatch.py C:/data --stage speWatch:PrintInfo --checkpoint watch.json
+"""
+
+import importlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+#True when the header says the file is finished: spe3 with a footer offset inside the file, or any spe2.x file
+def IsComplete(filePath: str, size: int) -> bool:
+    if size < 4100:
+        return False
+    try:
+        with open(filePath, 'rb') as f:
+            header = f.read(4100)
+    except OSError:
+        return False
+    if len(header) < 4100:
+        return False
+    version = struct.unpack_from('<f', header, 1992)[0]
+    if version < 3:
+        return True
+    xmlLoc = struct.unpack_from('<Q', header, 678)[0]
+    return 4100 <= xmlLoc < size
+
+class SpeWatcher:
+    def __init__(self, directory: str, stages: list, *, extension: str='.spe', recursive: bool=False, workers: int=4, maxPending: int=16,
+                 pollInterval: float=1.0, settleTime: float=2.0, rescanInterval: float=60.0, checkpointPath: str=None, onError=None):
+        if len(stages) == 0:
+            raise ValueError('At least one stage is needed')
+        if workers < 1 or maxPending < 1:
+            raise ValueError('workers and maxPending must be at least 1')
+        self.directory = os.path.abspath(directory)
+        self.stages = list(stages)
+        self.extension = extension.lower()
+        self.recursive = recursive
+        self.maxPending = maxPending
+        self.pollInterval = pollInterval
+        self.settleTime = settleTime
+        self.rescanInterval = rescanInterval
+        self.checkpointPath = checkpointPath
+        #called as onError(context, exception) when a stage raises, the file is then recorded as failed
+        self.onError = onError
+        #path --> [size, mtime_ns] of files that went through every stage / that failed in a stage
+        self.processed = {}
+        self.failed = {}
+        #path --> (size, mtime_ns, time the signature was first seen) for files not handed on yet
+        self._candidates = {}
+        self._inFlight = set()
+        #directory --> (mtime_ns, subdirectories, spe files, time.time_ns() of the listing) from its last listing
+        self._listings = {}
+        self._lastRescan = time.monotonic()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='SpeWatcher')
+        if checkpointPath is not None and os.path.exists(checkpointPath):
+            with open(checkpointPath) as f:
+                stored = json.load(f)
+            self.processed = stored.get('processed', {})
+            self.failed = stored.get('failed', {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    #yields (directory, spe files, names added since the last listing) per directory; a directory is listed again only when its
+    #mtime changed (a file was created, removed or renamed in it) or on a full rescan, otherwise the last listing is reused.
+    #Listings taken less than 2 s after the mtime are not trusted, coarse mtimes (FAT, SMB shares) can hide a change in the same tick
+    def _Scan(self, directory, full):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        listing = self._listings.get(directory)
+        if listing is not None and listing[0] == mtime and listing[3]-mtime >= 2*10**9 and not full:
+            added = ()
+        else:
+            subdirectories = []
+            files = []
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                return
+            listedAt = time.time_ns()
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.lower().endswith(self.extension):
+                    files.append(entry.path)
+            added = files if listing is None or full else set(files)-set(listing[2])
+            listing = (mtime, subdirectories, files, listedAt)
+            self._listings[directory] = listing
+        yield directory, listing[2], added
+        if self.recursive:
+            for subdirectory in listing[1]:
+                yield from self._Scan(subdirectory, full)
+
+    #one pass over the directory: tracks new / changed files and dispatches the ones that are complete, oldest first
+    #returns the number of files dispatched
+    def Poll(self) -> int:
+        now = time.monotonic()
+        full = now-self._lastRescan >= self.rescanInterval
+        if full:
+            self._lastRescan = now
+        ready = []
+        seen = set()
+        #only new names and files not handed on yet are stat'ed, a full rescan also catches processed files that were rewritten
+        toCheck = []
+        visited = set()
+        for directory, files, added in self._Scan(self.directory, full):
+            visited.add(directory)
+            seen.update(files)
+            toCheck.extend(added)
+        toCheck.extend(path for path in self._candidates if path in seen)
+        for path in dict.fromkeys(toCheck):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._candidates.pop(path, None)
+                continue
+            signature = [stat.st_size, stat.st_mtime_ns]
+            with self._lock:
+                if path in self._inFlight or self.processed.get(path) == signature or self.failed.get(path) == signature:
+                    continue
+            candidate = self._candidates.get(path)
+            if candidate is None or list(candidate[:2]) != signature:
+                #new file or still growing, the settle time starts over
+                self._candidates[path] = (stat.st_size, stat.st_mtime_ns, now)
+                if self.settleTime > 0:
+                    continue
+                candidate = self._candidates[path]
+            if now-candidate[2] >= self.settleTime and IsComplete(path, stat.st_size):
+                ready.append((stat.st_mtime_ns, path, signature))
+        #files deleted before they were handed on
+        for path in [path for path in self._candidates if path not in seen]:
+            del self._candidates[path]
+        #directories that are gone
+        for directory in set(self._listings)-visited:
+            del self._listings[directory]
+        dispatched = 0
+        for _, path, signature in sorted(ready):
+            with self._lock:
+                if len(self._inFlight) >= self.maxPending:
+                    break
+                self._inFlight.add(path)
+            del self._candidates[path]
+            self._pool.submit(self._Process, path, signature)
+            dispatched += 1
+        self.SaveCheckpoint(onlyIfChanged=True)
+        return dispatched
+
+    def _Process(self, path, signature):
+        context = {'file': path, 'size': signature[0], 'mtime_ns': signature[1]}
+        try:
+            for stage in self.stages:
+                stage(context)
+        except Exception as error:
+            with self._lock:
+                self.failed[path] = signature
+                self.processed.pop(path, None)
+                self._inFlight.discard(path)
+                self._dirty = True
+            if self.onError is not None:
+                self.onError(context, error)
+            else:
+                print('%s failed: %s: %s'%(path, type(error).__name__, error), file=sys.stderr)
+            return
+        with self._lock:
+            self.processed[path] = signature
+            self.failed.pop(path, None)
+            self._inFlight.discard(path)
+            self._dirty = True
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._inFlight)
+
+    #polls until Stop(), timeout seconds, or maxFiles files have been processed or failed
+    def Run(self, *, timeout: float=None, maxFiles: int=None):
+        start = time.monotonic()
+        done = len(self.processed) + len(self.failed)
+        try:
+            while not self._stop.is_set():
+                self.Poll()
+                if maxFiles is not None and len(self.processed)+len(self.failed)-done >= maxFiles:
+                    break
+                if timeout is not None and time.monotonic()-start >= timeout:
+                    break
+                self._stop.wait(self.pollInterval)
+        finally:
+            self.Close()
+
+    def Stop(self):
+        self._stop.set()
+
+    #waits for the files in work, then writes the checkpoint
+    def Close(self):
+        self._stop.set()
+        self._pool.shutdown(wait=True)
+        self.SaveCheckpoint()
+
+    #checkpoint is replaced only once the new one is complete
+    def SaveCheckpoint(self, *, onlyIfChanged: bool=False):
+        if self.checkpointPath is None:
+            return
+        with self._lock:
+            if onlyIfChanged and not self._dirty:
+                return
+            stored = {'directory': self.directory, 'processed': dict(self.processed), 'failed': dict(self.failed)}
+            self._dirty = False
+        tmpPath = self.checkpointPath + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(stored, f)
+        os.replace(tmpPath, self.checkpointPath)
+
+#stage that prints the speInfo summary of the file as one json line
+def PrintInfo(context):
+    from speInfo import SpeInfo
+    context['info'] = SpeInfo(context['file'])
+    print(json.dumps(context['info']), flush=True)
+
+#stage factory: adds each file to an speCatalog database
+def CatalogStage(dbPath: str):
+    def Catalog(context):
+        from speCatalog import SpeCatalog
+        with SpeCatalog(dbPath) as catalog:
+            catalog.Index(context['file'], workers=1)
+    return Catalog
+
+#'module:function' --> the function, used for --stage on the command line
+def _LoadStage(text):
+    moduleName, _, name = text.partition(':')
+    if name == '':
+        raise ValueError('Stage must be given as module:function, got %s'%(text))
+    return getattr(importlib.import_module(moduleName), name)
+
+if __name__=="__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Watch a directory and run processing stages on each completed spe file')
+    parser.add_argument('directory')
+    parser.add_argument('--stage', action='append', default=[], help='module:function, called with the file context; repeat for a pipeline')
+    parser.add_argument('--catalog', default=None, help='also add each file to this speCatalog database')
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-pending', type=int, default=16)
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between directory scans')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds a file must stay unchanged before it is processed')
+    parser.add_argument('--rescan', type=float, default=60.0, help='seconds between full rescans that catch rewritten files')
+    parser.add_argument('--timeout', type=float, default=None)
+    args = parser.parse_args()
+    stages = [_LoadStage(item) for item in args.stage]
+    if args.catalog is not None:
+        stages.append(CatalogStage(args.catalog))
+    if len(stages) == 0:
+        stages = [PrintInfo]
+    watcher = SpeWatcher(args.directory, stages, recursive=args.recursive, workers=args.workers, maxPending=args.max_pending,
+                         pollInterval=args.poll, settleTime=args.settle, rescanInterval=args.rescan, checkpointPath=args.checkpoint)
+    try:
+        watcher.Run(timeout=args.timeout)
+    except KeyboardInterrupt:
+        watcher.Close()
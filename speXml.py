@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Indexed parser for the spe3 xml footer, shared by readSpe and the viewers
+
+usage:
+- from speXml import IndexFooter
+- index = IndexFooter(xmlFooter)   (parsed once per footer string, repeated calls are cached)
+- index.Get('Devices/Cameras/Camera/Adc/Speed', relevant=True)   --> 2.0
+----- paths are namespace-stripped tag names, any trailing part of the full path can be used as the key
+----- Get returns the text as a typed value (bool/int/float/str), GetAttribute returns an attribute string
+- GetSettingsSummary(index) --> dict of the experiment settings printed by showSpeMPL
+"""
+
+import functools
+import xml.etree.ElementTree as ET
+
+#converts element text to bool/int/float where it looks like one, otherwise returns the stripped string
+def _Typed(text):
+    if text is None:
+        return None
+    text = text.strip()
+    if text == '':
+        return None
+    if text == 'True':
+        return True
+    if text == 'False':
+        return False
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+class XmlEntry:
+    __slots__ = ('tag', 'path', 'text', 'attrib', 'relevant')
+    def __init__(self, tag, path, text, attrib, relevant):
+        self.tag = tag
+        self.path = path
+        self.text = text
+        self.attrib = attrib
+        #False when this element or one of its parents is marked relevance="False"
+        self.relevant = relevant
+
+    @property
+    def value(self):
+        return _Typed(self.text)
+
+class XmlIndex:
+    def __init__(self, xmlFooter: str):
+        self.root = None
+        self.entries = []
+        self._lookup = {}
+        if xmlFooter is None or len(xmlFooter.strip()) == 0:
+            return
+        self.root = ET.fromstring(xmlFooter)
+        #single walk of the tree, every element is filed under each trailing part of its path
+        stack = [(child, (), True) for child in reversed(list(self.root))]
+        while stack:
+            elem, parentParts, parentRelevant = stack.pop()
+            tag = elem.tag.rsplit('}',maxsplit=1)[-1]
+            parts = parentParts + (tag,)
+            relevant = parentRelevant and elem.get('relevance') != 'False'
+            entry = XmlEntry(tag, '/'.join(parts), elem.text, elem.attrib, relevant)
+            self.entries.append(entry)
+            for i in range(0,len(parts)):
+                self._lookup.setdefault('/'.join(parts[i:]), []).append(entry)
+            stack.extend((child, parts, relevant) for child in reversed(list(elem)))
+
+    #all elements whose path ends with the given path, in document order
+    def GetAll(self, path: str, *, relevant: bool=False):
+        entries = self._lookup.get(path.strip('/'), [])
+        if relevant:
+            return [entry for entry in entries if entry.relevant]
+        return entries
+
+    def GetEntry(self, path: str, *, relevant: bool=False):
+        for entry in self._lookup.get(path.strip('/'), []):
+            if entry.relevant or not relevant:
+                return entry
+        return None
+
+    #typed text of the first matching element, relevant=True skips elements marked relevance="False"
+    def Get(self, path: str, default=None, *, relevant: bool=False):
+        entry = self.GetEntry(path, relevant=relevant)
+        if entry is None or entry.value is None:
+            return default
+        return entry.value
+
+    def GetAttribute(self, path: str, name: str, default=None, *, relevant: bool=False):
+        entry = self.GetEntry(path, relevant=relevant)
+        if entry is None:
+            return default
+        return entry.attrib.get(name, default)
+
+    def __contains__(self, path):
+        return path.strip('/') in self._lookup
+
+#parses a footer once, repeated calls with the same footer string (reader, viewers, settings queries) reuse the index
+@functools.lru_cache(maxsize=16)
+def IndexFooter(xmlFooter: str):
+    return XmlIndex(xmlFooter)
+
+def _Float(value):
+    return None if value is None else float(value)
+
+#experiment settings from the footer in one dict, None where a setting is missing or not relevant
+def GetSettingsSummary(index: XmlIndex) -> dict:
+    camera = 'Devices/Cameras/Camera/'
+    summary = {
+        'lf_version': index.GetAttribute('DataHistories/DataHistory/Origin', 'softwareVersion'),
+        'camera_model': index.GetAttribute('System/Cameras/Camera', 'model'),
+        'camera_serial': index.GetAttribute('System/Cameras/Camera', 'serialNumber'),
+        'spectrometer_model': index.GetAttribute('System/Spectrometers/Spectrometer', 'model'),
+        'spectrometer_serial': index.GetAttribute('System/Spectrometers/Spectrometer', 'serialNumber'),
+        'sensor_name': index.Get(camera+'Sensor/Information/SensorName'),
+        'pixel_width': index.Get(camera+'Sensor/Information/Pixel/Width'),
+        'sensor_temperature': _Float(index.Get(camera+'Sensor/Temperature/Reading')),
+        'temperature_status': index.Get(camera+'Sensor/Temperature/Status'),
+        'vacuum_status': index.Get(camera+'Sensor/Temperature/VacuumStatus'),
+        'clean_serial_register': index.Get(camera+'Sensor/Cleaning/CleanSerialRegister', relevant=True),
+        'clean_until_trigger': index.Get(camera+'Sensor/Cleaning/CleanUntilTrigger', relevant=True),
+        'exposure': _Float(index.Get(camera+'ShutterTiming/ExposureTime')),
+        'shutter_mode': index.Get(camera+'ShutterTiming/Mode'),
+        'gate_mode': None,
+        'gate_start_width': None,
+        'gate_start_delay': None,
+        'gate_end_width': None,
+        'gate_end_delay': None,
+        'intensifier_gain': index.Get(camera+'Intensifier/Gain', relevant=True),
+        'intensifier_status': index.Get(camera+'Intensifier/Status'),
+        'emi_gain': index.Get(camera+'Intensifier/EMIccd/Gain', relevant=True),
+        'readout_mode': index.Get(camera+'ReadoutControl/Mode'),
+        'readout_time': _Float(index.Get(camera+'ReadoutControl/Time')),
+        'storage_shift_rate': index.Get(camera+'ReadoutControl/StorageShiftRate', relevant=True),
+        'vertical_shift_rate': index.Get(camera+'ReadoutControl/VerticalShiftRate', relevant=True),
+        'ports_used': index.Get(camera+'ReadoutControl/PortsUsed'),
+        'accumulations': index.Get(camera+'ReadoutControl/Accumulations'),
+        'trigger_source': index.Get(camera+'HardwareIO/Trigger/Source'),
+        'trigger_frequency': _Float(index.Get(camera+'HardwareIO/Trigger/Frequency')),
+        'adc_speed': _Float(index.Get(camera+'Adc/Speed', relevant=True)),
+        'analog_gain': index.Get(camera+'Adc/AnalogGain', relevant=True),
+        'em_gain': index.Get(camera+'Adc/EMGain', relevant=True),
+        'adc_quality': index.Get(camera+'Adc/Quality'),
+        'pixel_bias_correction': index.Get(camera+'Adc/CorrectPixelBias'),
+        'bit_depth': index.Get(camera+'Adc/BitDepth'),
+        'frame_rate': _Float(index.Get(camera+'Acquisition/FrameRate')),
+        'frame_combination': None,
+        'frames_combined': None,
+        'corrections': [],
+        'grating': index.Get('Devices/Spectrometers/Spectrometer/Grating/Selected'),
+        'center_wavelength': _Float(index.Get('Devices/Spectrometers/Spectrometer/Grating/CenterWavelength')),
+        'step_and_glue': None,
+        'calibrations': [],
+    }
+    #gating, sequential and DIF gates have start and end pulses, repetitive only one
+    gateMode = index.Get(camera+'Gating/Mode')
+    if gateMode == 'Repetitive':
+        pulse = index.GetEntry(camera+'Gating/RepetitiveGate/Pulse', relevant=True)
+        if pulse is not None:
+            summary['gate_start_width'] = _Float(pulse.attrib.get('width'))
+            summary['gate_start_delay'] = _Float(pulse.attrib.get('delay'))
+    if gateMode == 'Sequential' or camera+'Gating/Dif' in index:
+        group = 'Sequential' if gateMode == 'Sequential' else 'Dif'
+        start = index.GetEntry(camera+'Gating/%s/StartingGate/Pulse'%(group), relevant=True)
+        end = index.GetEntry(camera+'Gating/%s/EndingGate/Pulse'%(group), relevant=True)
+        if group == 'Dif' and end is not None:
+            gateMode = 'Dif'
+        if start is not None:
+            summary['gate_start_width'] = _Float(start.attrib.get('width'))
+            summary['gate_start_delay'] = _Float(start.attrib.get('delay'))
+        if end is not None:
+            summary['gate_end_width'] = _Float(end.attrib.get('width'))
+            summary['gate_end_delay'] = _Float(end.attrib.get('delay'))
+    summary['gate_mode'] = gateMode
+    #online processing
+    method = index.GetEntry('Devices/Cameras/Camera/Experiment/OnlineProcessing/FrameCombination/Method')
+    if method is not None and method.attrib.get('relevance') != 'False':
+        summary['frame_combination'] = method.text
+        summary['frames_combined'] = index.Get('Devices/Cameras/Camera/Experiment/OnlineProcessing/FrameCombination/FramesCombined', 1)
+    for correction,name in (('OrientationCorrection','Orientation'), ('BlemishCorrection','Blemish'), ('BackgroundCorrection','Background'),
+                            ('FlatfieldCorrection','Flatfield'), ('CosmicRayCorrection','Cosmic')):
+        if index.Get('Devices/Cameras/Camera/Experiment/OnlineCorrections/%s/Enabled'%(correction)) is True:
+            summary['corrections'].append(name)
+    #spectrometer calibrations
+    spectrometer = 'Devices/Spectrometers/Spectrometer/Experiment/'
+    if index.Get(spectrometer+'StepAndGlue/Enabled') is True:
+        summary['step_and_glue'] = (_Float(index.Get(spectrometer+'StepAndGlue/StartingWavelength', 0)),
+                                    _Float(index.Get(spectrometer+'StepAndGlue/EndingWavelength', 0)))
+    if index.Get(spectrometer+'IntensityCalibration/Enabled') is True:
+        summary['calibrations'].append('Intensity')
+    calMode = index.GetEntry(spectrometer+'WavelengthCalibration/Mode')
+    if calMode is not None and calMode.attrib.get('type') != 'NullableCalibrationMode':
+        summary['calibrations'].append('Wavelength (%s)'%(calMode.text))
+    return summary
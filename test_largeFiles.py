@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Reads near and beyond the 4 GiB byte and 2**31 element boundaries, on sparse spe files
+
+usage:
+- python -m pytest test_largeFiles.py
+- the files are created with f.truncate(), so only the 4100 byte header, a few marker frames and the footer take disk space
+  (needs a file system with sparse files: ext4, xfs, apfs...; skipped elsewhere)
+- every marker frame holds np.arange(pixels) + frame, so a read from a wrong or truncated offset shows up as a mismatch
+- readSpe() loads the whole data block, its tests only run when there is enough free memory
+"""
+
+import os
+import numpy as np
+import pytest
+from readSpe import readSpe, SpeReference
+
+#spe3 file: two regions plus two 8 byte metadata entries per readout, uint32 so that element 2**31 sits at byte 2**33
+width3, height3, width3b, height3b = 1024, 512, 64, 32
+metaBytes3 = 16
+readoutStride3 = (width3*height3 + width3b*height3b)*4 + metaBytes3
+numFrames3 = (2**33-4100)//readoutStride3 + 20
+
+#spe2.x uint16 file, element 2**31 is byte 2**32 of the data block
+width2, height2 = 1000, 1100
+numFrames2 = (2**32-4100)//(width2*height2*2) + 10
+
+#spe2.x uint8 file just past 2**31 elements, small enough to load whole with readSpe()
+width2b, height2b = 1000, 1000
+numFrames2b = 2**31//(width2b*height2b) + 3
+
+#readout that contains the given byte of the file
+def _FrameAt(byte, stride):
+    return (byte-4100)//stride
+
+def _Markers(stride, numFrames):
+    markers = {0, numFrames-1}
+    for boundary in (2**31, 2**32, 2**33):
+        frame = _FrameAt(boundary, stride)
+        if frame < numFrames:
+            markers.update(frame+k for k in (-1, 0, 1) if 0 <= frame+k < numFrames)
+    return sorted(markers)
+
+def _Pattern(frame, shape, dtype):
+    return ((np.arange(int(np.prod(shape)), dtype=np.int64) + frame) % (np.iinfo(dtype).max+1)).astype(dtype).reshape(shape)
+
+def _Header(xmlLoc, version, dataType, width, height, numFrames):
+    header = bytearray(4100)
+    np.frombuffer(header, dtype=np.uint16, count=1, offset=42)[0] = width
+    np.frombuffer(header, dtype=np.int16, count=1, offset=108)[0] = dataType
+    np.frombuffer(header, dtype=np.uint16, count=1, offset=656)[0] = height
+    np.frombuffer(header, dtype=np.uint64, count=1, offset=678)[0] = xmlLoc
+    np.frombuffer(header, dtype=np.int32, count=1, offset=1446)[0] = numFrames
+    np.frombuffer(header, dtype=np.float32, count=1, offset=1992)[0] = version
+    np.frombuffer(header, dtype=np.int16, count=1, offset=4098)[0] = 0x5555
+    return bytes(header)
+
+def _Footer3():
+    regionSize = width3*height3*4
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<SpeFormat version="3.0" xmlns="http://www.princetoninstruments.com/spe/2009">'
+            '<DataFormat><DataBlock type="Frame" count="%d" pixelFormat="MonochromeUnsigned32" size="%d" stride="%d">'
+            %(numFrames3, readoutStride3-metaBytes3, readoutStride3) +
+            '<DataBlock type="Region" count="1" width="%d" height="%d" size="%d" stride="%d" />'%(width3, height3, regionSize, regionSize) +
+            '<DataBlock type="Region" count="1" width="%d" height="%d" size="%d" stride="%d" />'
+            %(width3b, height3b, width3b*height3b*4, width3b*height3b*4) +
+            '</DataBlock></DataFormat>'
+            '<MetaFormat><MetaBlock type="Frame" count="%d">'%(numFrames3) +
+            '<TimeStamp event="ExposureStarted" type="Int64" bitDepth="64" resolution="1000000" />'
+            '<FrameTrackingNumber type="Int64" bitDepth="64" />'
+            '</MetaBlock></MetaFormat></SpeFormat>')
+
+def _Sparse(path, header, size):
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(size)
+
+def _Available():
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    return 0
+
+@pytest.fixture(scope='module')
+def directory(tmp_path_factory):
+    path = tmp_path_factory.mktemp('largeFiles')
+    probe = str(path/'probe')
+    _Sparse(probe, b'', 1 << 30)
+    sparse = getattr(os.stat(probe), 'st_blocks', None)
+    os.remove(probe)
+    if sparse is None or sparse*512 >= 1 << 20:
+        pytest.skip('file system has no sparse files')
+    return path
+
+@pytest.fixture(scope='module')
+def spe3(directory):
+    path = str(directory/'large3.spe')
+    xmlLoc = 4100 + numFrames3*readoutStride3
+    footer = _Footer3().encode('utf8')
+    _Sparse(path, _Header(xmlLoc, 3.0, 8, width3, height3, numFrames3), xmlLoc+len(footer))
+    markers = _Markers(readoutStride3, numFrames3)
+    with open(path, 'r+b') as f:
+        for frame in markers:
+            f.seek(4100 + frame*readoutStride3)
+            f.write(_Pattern(frame, (height3, width3), np.uint32).tobytes())
+            f.write(_Pattern(frame*3, (height3b, width3b), np.uint32).tobytes())
+            f.write(np.array([frame*1000, frame+1], dtype=np.int64).tobytes())
+        f.seek(xmlLoc)
+        f.write(footer)
+    yield path, markers
+    os.remove(path)
+
+@pytest.fixture(scope='module')
+def spe2(directory):
+    path = str(directory/'large2.spe')
+    stride = width2*height2*2
+    _Sparse(path, _Header(0, 2.2, 3, width2, height2, numFrames2), 4100 + numFrames2*stride)
+    markers = _Markers(stride, numFrames2)
+    with open(path, 'r+b') as f:
+        for frame in markers:
+            f.seek(4100 + frame*stride)
+            f.write(_Pattern(frame, (height2, width2), np.uint16).tobytes())
+    yield path, markers
+    os.remove(path)
+
+def test_layout(spe3, spe2):
+    spe = SpeReference(spe3[0])
+    assert int(spe.numFrames) == numFrames3
+    assert int(spe.readoutStride) == readoutStride3
+    assert int(spe.offsetTable[-1,0]) == 4100 + (numFrames3-1)*readoutStride3
+    assert int(spe.offsetTable[-1,1]) == 4100 + (numFrames3-1)*readoutStride3 + width3*height3*4
+    spe = SpeReference(spe2[0])
+    assert int(spe.numFrames) == numFrames2
+    assert int(spe.offsetTable[-1,0]) == 4100 + (numFrames2-1)*width2*height2*2
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_GetData_spe3(spe3, memmap):
+    path, markers = spe3
+    spe = SpeReference(path, memmap=memmap)
+    data, small = spe.GetData(frames=markers, dtype=None)
+    for k,frame in enumerate(markers):
+        assert np.array_equal(data[k], _Pattern(frame, (height3, width3), np.uint32))
+        assert np.array_equal(small[k], _Pattern(frame*3, (height3b, width3b), np.uint32))
+    #the whole small region: every readout up to the end of the file, zero outside the marker frames
+    small = spe.GetData(rois=[1], dtype=None)[0]
+    assert small.shape == (numFrames3, height3b, width3b)
+    assert np.array_equal(np.flatnonzero(small.reshape(numFrames3, -1).any(axis=1)), markers)
+    spe.Close()
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_GetData_spe2(spe2, memmap):
+    path, markers = spe2
+    spe = SpeReference(path, memmap=memmap)
+    data = spe.GetData(frames=markers, dtype=None)[0]
+    for k,frame in enumerate(markers):
+        assert np.array_equal(data[k], _Pattern(frame, (height2, width2), np.uint16))
+    spe.Close()
+
+def test_SpeArray(spe3, spe2):
+    path, markers = spe3
+    spe = SpeReference(path)
+    frame = _FrameAt(2**33, readoutStride3)
+    expected = _Pattern(frame, (height3, width3), np.uint32)
+    assert np.array_equal(spe.Roi(0)[frame], expected)
+    assert np.array_equal(spe.Roi(0)[frame, 100:300:7, 900:], expected[100:300:7, 900:])
+    assert np.array_equal(spe.Roi(0)[frame-1:frame+2, -1, -5:], np.stack([_Pattern(j, (height3, width3), np.uint32)[-1, -5:] for j in (frame-1, frame, frame+1)]))
+    assert np.array_equal(spe.Roi(1)[-1], _Pattern((numFrames3-1)*3, (height3b, width3b), np.uint32))
+    path, markers = spe2
+    spe = SpeReference(path, memmap=True)
+    frame = _FrameAt(2**32, width2*height2*2)
+    assert np.array_equal(spe.Roi(0)[frame, 500:], _Pattern(frame, (height2, width2), np.uint16)[500:])
+
+def test_IterFrames(spe3):
+    path, markers = spe3
+    spe = SpeReference(path)
+    seen = []
+    for frames, (data, small) in spe.IterFrames(frames=markers, chunkFrames=2):
+        for k,frame in enumerate(frames):
+            assert np.array_equal(data[k], _Pattern(int(frame), (height3, width3), np.uint32))
+            seen.append(int(frame))
+    assert seen == markers
+
+def test_GetMetadata(spe3):
+    path, markers = spe3
+    spe = SpeReference(path)
+    metadata = spe.GetMetadata(frames=markers)
+    assert np.array_equal(metadata['frame'], markers)
+    assert np.allclose(metadata['ExposureStarted'], np.array(markers)*1e-3)
+    assert np.array_equal(metadata['FrameTrackingNumber'], np.array(markers)+1)
+    #every readout, the last one ends right at the footer
+    metadata = spe.GetMetadata()
+    assert len(metadata) == numFrames3
+    assert np.array_equal(np.flatnonzero(metadata['FrameTrackingNumber']), markers)
+    assert metadata['FrameTrackingNumber'][-1] == numFrames3
+
+def test_readSpe_spe2(directory):
+    size = numFrames2b*width2b*height2b
+    if _Available() < 2.2*size:
+        pytest.skip('readSpe needs about %.1f GiB of free memory'%(2.2*size/2**30))
+    path = str(directory/'large2b.spe')
+    stride = width2b*height2b
+    _Sparse(path, _Header(0, 2.2, 6, width2b, height2b, numFrames2b), 4100 + numFrames2b*stride)
+    frame = 2**31//stride
+    with open(path, 'r+b') as f:
+        for item in (frame-1, frame, numFrames2b-1):
+            f.seek(4100 + item*stride)
+            f.write(_Pattern(item, (height2b, width2b), np.uint8).tobytes())
+    try:
+        data = readSpe(path).data[0]
+        assert data.shape == (numFrames2b, height2b, width2b)
+        for item in (frame-1, frame, numFrames2b-1):
+            assert np.array_equal(data[item], _Pattern(item, (height2b, width2b), np.uint8))
+        del data
+    finally:
+        os.remove(path)
+
+def test_readSpe_spe3(spe3):
+    path, markers = spe3
+    if _Available() < 2.2*numFrames3*readoutStride3:
+        pytest.skip('readSpe needs about %.1f GiB of free memory'%(2.2*numFrames3*readoutStride3/2**30))
+    data, small = readSpe(path).data
+    for frame in markers:
+        assert np.array_equal(data[frame], _Pattern(frame, (height3, width3), np.uint32))
+        assert np.array_equal(small[frame], _Pattern(frame*3, (height3b, width3b), np.uint32))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Reads from spe files whose header promises more readouts than the file holds
+
+usage:
+- python -m pytest test_truncatedFiles.py
+- reads that run past the end of the file must raise EOFError, never return bytes left in the reused read buffer
+"""
+
+import numpy as np
+import pytest
+from readSpe import SpeReference
+from test_largeFiles import _Header, _Pattern
+
+width, height = 64, 32
+numFrames, numWritten = 50, 20
+
+@pytest.fixture
+def truncated(tmp_path):
+    path = str(tmp_path/'truncated.spe')
+    with open(path, 'wb') as f:
+        f.write(_Header(0, 2.2, 3, width, height, numFrames))
+        for frame in range(numWritten):
+            f.write(_Pattern(frame, (height, width), np.uint16).tobytes())
+    return path
+
+def test_GetData(truncated):
+    spe = SpeReference(truncated)
+    with pytest.raises(EOFError):
+        spe.GetData(frames=[48, 49], dtype=None)
+    spe.Close()
+
+def test_GetData_after_read(truncated):
+    spe = SpeReference(truncated)
+    data = spe.GetData(frames=[0, 1], dtype=None)[0]
+    assert np.array_equal(data[1], _Pattern(1, (height, width), np.uint16))
+    with pytest.raises(EOFError):
+        spe.GetData(frames=[48, 49], dtype=None)
+    #a read straddling the end of the file
+    with pytest.raises(EOFError):
+        spe.GetData(frames=[numWritten-1, numWritten], dtype=None)
+    spe.Close()
+
+def test_Roi(truncated):
+    spe = SpeReference(truncated)
+    assert np.array_equal(spe.Roi(0)[numWritten-1, 5:], _Pattern(numWritten-1, (height, width), np.uint16)[5:])
+    with pytest.raises(EOFError):
+        spe.Roi(0)[numWritten, 5:]
+    spe.Close()
+
+def test_IterFrames(truncated):
+    spe = SpeReference(truncated)
+    seen = []
+    with pytest.raises(EOFError):
+        for frames, (data,) in spe.IterFrames(chunkFrames=8):
+            seen.extend(int(frame) for frame in frames)
+    assert seen == list(range(16))
+    spe.Close()